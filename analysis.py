@@ -0,0 +1,194 @@
+import argparse
+import csv
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from recording import RECORDING_PREFIX, ChunkedRecording, is_recording
+from timeindex import RecordingIndex
+
+# Post-test analysis over recorded runs (recording_<ts> folders from Logger, or older
+# pressure_<ts>.csv / valves_<ts>.csv pairs).
+# Each run is loaded and analysed in its own process, and every valve event gets one summary
+# row per channel. Usage:
+#   python analysis.py logs/ -o campaign_summary.csv
+
+WINDOW_S = 5.0          # Max time analysed after each valve event
+PRE_EVENT_S = 0.5       # Pre-event baseline averaged over this long
+STEADY_FRACTION = 0.2   # Last 20% of the event window is treated as steady state
+SETTLE_TOL = 0.05       # Settled once within 5% of the step size of the final value
+STEP_SIGMA = 4.0        # A channel only responded if its step clears this many σ of noise...
+STEP_MIN_BAR = 1.0      # ...and this many bar, otherwise rise/settling/overshoot are NaN
+DP_CHANNEL = "dP_Injector_bar"   # Derived P3 - P4 channel, its peak is the peak ΔP across the injector
+
+SUMMARY_FIELDS = [
+    "run", "event_time", "valve", "action", "channel",
+    "initial", "ss_mean", "ss_std", "peak", "rise_time", "settling_time", "overshoot_pct",
+]
+
+
+def find_runs(paths: list[str]) -> list[tuple[str, str, str | None]]:
+    # Returns (run name, pressure csv, valve csv) for every complete pair found, and
+    # (run name, recording folder, None) for chunked recordings
+    runs = []
+    for p in paths:
+        p = p.rstrip("/\\")
+        if is_recording(p):
+            runs.append((os.path.basename(p), p, None))
+            continue
+        if os.path.isdir(p):
+            for folder in sorted(glob.glob(os.path.join(p, RECORDING_PREFIX + "*"))):
+                if is_recording(folder):
+                    runs.append((os.path.basename(folder), folder, None))
+        pattern = os.path.join(p, "pressure_*.csv") if os.path.isdir(p) else p
+        for pressure_path in sorted(glob.glob(pattern)):
+            name = os.path.basename(pressure_path)
+            ts = name[len("pressure_"):-len(".csv")]
+            valve_path = os.path.join(os.path.dirname(pressure_path), f"valves_{ts}.csv")
+            if os.path.exists(valve_path):
+                runs.append((ts, pressure_path, valve_path))
+    return runs
+
+
+def with_injector_dp(names: list[str], values: np.ndarray) -> tuple[list[str], np.ndarray]:
+    # P3 and P4 sit either side of the injector
+    if values.shape[1] < 4:
+        return names, values
+    dp = values[:, 2] - values[:, 3]
+    return names + [DP_CHANNEL], np.column_stack([values, dp])
+
+
+def event_metrics(t: np.ndarray, y: np.ndarray, t0: float, baseline: np.ndarray,
+                  baseline_std: np.ndarray | None = None) -> dict[str, np.ndarray]:
+    """Step response metrics for every channel at once. t is (n,), y is (n, channels), t0 is the
+    event time and baseline/baseline_std the pre-event mean and noise per channel. Undefined
+    metrics are NaN, including for channels whose step is lost in the noise."""
+    n = len(t)
+    ss_start = int(n * (1.0 - STEADY_FRACTION))
+    steady = y[ss_start:]
+    final = steady.mean(axis=0)
+    ss_std = steady.std(axis=0)
+    step = final - baseline
+    noise = ss_std if baseline_std is None else np.maximum(baseline_std, ss_std)
+    valid = np.abs(step) > np.maximum(STEP_SIGMA * noise, STEP_MIN_BAR)
+    safe_step = np.where(valid, step, 1.0)
+
+    # Normalised response: 0 at baseline, 1 at final value, for rising and falling steps alike
+    norm = (y - baseline) / safe_step
+    t_rel = t - t0
+
+    def first_crossing(level):
+        hit = norm >= level
+        idx = hit.argmax(axis=0)
+        return np.where(hit.any(axis=0) & valid, t_rel[idx], np.nan)
+
+    rise = first_crossing(0.9) - first_crossing(0.1)
+
+    outside = np.abs(y - final) > SETTLE_TOL * np.abs(safe_step)
+    # Index of the last sample outside the band - settled from the next sample on
+    last_out = n - 1 - outside[::-1].argmax(axis=0)
+    settle_idx = np.minimum(last_out + 1, n - 1)
+    settling = np.where(outside.any(axis=0), t_rel[settle_idx], 0.0)
+    settling = np.where(valid, settling, np.nan)
+
+    overshoot = np.where(valid, (norm.max(axis=0) - 1.0) * 100.0, np.nan)
+    peak_idx = np.abs(y).argmax(axis=0)
+    return {
+        "initial": baseline,
+        "ss_mean": final,
+        "ss_std": ss_std,
+        "peak": y[peak_idx, np.arange(y.shape[1])],
+        "rise_time": rise,
+        "settling_time": settling,
+        "overshoot_pct": np.maximum(overshoot, 0.0),
+    }
+
+
+def analyse_run(run: tuple[str, str, str | None], window_s: float = WINDOW_S) -> list[dict]:
+    name, path, valve_path = run
+    if valve_path is not None:
+        return event_rows(name, RecordingIndex.open(path, valve_path), window_s)
+    # Chunked recording - one chunk at a time, with the neighbours its event windows reach into,
+    # so memory stays bounded however long the recording is
+    rec = ChunkedRecording(path)
+    rows = []
+    for i, chunk in enumerate(rec.chunks):
+        t_lo = chunk["t_start"] if i else -np.inf
+        t_hi = rec.chunks[i + 1]["t_start"] if i + 1 < len(rec.chunks) else np.inf
+        # Starting from the previous chunk keeps the valve state continuous across the boundary
+        t_from = min(chunk["t_start"] - PRE_EVENT_S, rec.chunks[i - 1]["t_end"]) if i else chunk["t_start"]
+        idx = rec.index_between(t_from, chunk["t_end"] + window_s)
+        rows += event_rows(name, idx, window_s, t_lo, t_hi)
+    return rows
+
+
+def event_rows(name: str, idx: RecordingIndex, window_s: float, t_lo: float = -np.inf,
+               t_hi: float = np.inf) -> list[dict]:
+    # Summary rows for the events of idx with t_lo <= time < t_hi
+    names, values = with_injector_dp(idx.channels, idx.values)
+    t, event_times = idx.times, idx.event_times
+    rows = []
+    if len(t) < 2:
+        return rows
+    lo, hi = idx.events_between(t_lo, t_hi)
+    for i in range(lo, hi):
+        t0 = float(event_times[i])
+        # Window runs to the next distinct event time, capped at window_s
+        nxt = np.searchsorted(event_times, t0, side="right")
+        t_end = min(t0 + window_s, event_times[nxt] if nxt < len(event_times) else np.inf)
+        win = idx.slice_between(t0, t_end)
+        if win.stop - win.start < 2:
+            continue
+        pre = idx.slice_between(t0 - PRE_EVENT_S, t0)
+        if pre.stop > pre.start:
+            baseline, baseline_std = values[pre].mean(axis=0), values[pre].std(axis=0)
+        else:
+            baseline, baseline_std = values[win.start], None
+        metrics = event_metrics(t[win], values[win], t0, baseline, baseline_std)
+        valve = idx.valves[idx.event_valves[i]]
+        action = "OPEN" if idx.event_open[i] else "CLOSE"
+        for c, channel in enumerate(names):
+            row = {"run": name, "event_time": t0, "valve": valve, "action": action, "channel": channel}
+            for key, arr in metrics.items():
+                row[key] = float(arr[c])
+            rows.append(row)
+    return rows
+
+
+def analyse_campaign(runs, window_s: float = WINDOW_S, jobs: int | None = None) -> list[dict]:
+    # One run per worker process - results come back in run order
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = pool.map(analyse_run, runs, [window_s] * len(runs))
+        return [row for rows in results for row in rows]
+
+
+def write_summary(rows: list[dict], path: str):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({k: (f"{v:.4f}" if isinstance(v, float) else v) for k, v in row.items()})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch step-response analysis of FlowBench recordings")
+    parser.add_argument("paths", nargs="*", default=[os.path.dirname(os.path.abspath(__file__))],
+                        help="Log directories, recording_* folders or pressure_*.csv files (default: FlowBench folder)")
+    parser.add_argument("-o", "--output", default="campaign_summary.csv", help="Summary CSV to write")
+    parser.add_argument("-w", "--window", type=float, default=WINDOW_S, help="Seconds analysed after each event")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    runs = find_runs(args.paths)
+    if not runs:
+        print("[Analysis] No pressure/valve log pairs found.")
+        return 1
+    rows = analyse_campaign(runs, args.window, args.jobs)
+    write_summary(rows, args.output)
+    print(f"[Analysis] {len(runs)} run(s), {len(rows)} row(s) -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+import json
+import socket
+import sys
+import threading
+import time
+from collections import deque
+
+# Local publish/subscribe telemetry bus. FlowBench polls the ESP32 once and republishes every
+# sample and valve/sequence event here as newline-delimited JSON over a localhost TCP socket,
+# so any number of notebooks/scripts can listen without touching the single ESP32 connection.
+#
+#   from bus import subscribe
+#   for msg in subscribe():
+#       print(msg["type"], msg)
+
+BUS_HOST = "127.0.0.1"
+BUS_PORT = 5760
+QUEUE_LEN = 2000   # Per-subscriber backlog - a slow subscriber loses its oldest messages, never blocks publish
+
+
+class _Subscriber:
+    def __init__(self, conn: socket.socket, addr):
+        self.conn = conn
+        self.addr = addr
+        self.queue = deque(maxlen=QUEUE_LEN)
+        self.cond = threading.Condition()
+        self.dropped = 0
+        self.alive = True
+
+    def offer(self, line: bytes):
+        with self.cond:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(line)
+            self.cond.notify()
+
+    def close(self):
+        with self.cond:
+            self.alive = False
+            self.cond.notify()
+
+    def run(self, on_exit):
+        try:
+            while True:
+                with self.cond:
+                    while self.alive and not self.queue:
+                        self.cond.wait()
+                    if not self.alive:
+                        break
+                    # Take everything queued so far and send it in one write
+                    batch = b"".join(self.queue)
+                    self.queue.clear()
+                self.conn.sendall(batch)
+        except OSError:
+            pass
+        finally:
+            self.conn.close()
+            on_exit(self)
+
+
+class TelemetryBus:
+    def __init__(self, host: str = BUS_HOST, port: int = BUS_PORT):
+        self.host = host
+        self.port = port
+        self._server = None
+        self._subs = []
+        self._lock = threading.Lock()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subs)
+
+    def start(self) -> bool:
+        try:
+            self._server = socket.create_server((self.host, self.port))
+        except OSError as e:
+            print(f"[Bus] ERROR: Could not listen on {self.host}:{self.port}: {e}")
+            self._server = None
+            return False
+        self.port = self._server.getsockname()[1]
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return True
+
+    def stop(self):
+        if self._server:
+            self._server.close()
+            self._server = None
+        with self._lock:
+            subs, self._subs = self._subs, []
+        for sub in subs:
+            sub.close()
+
+    def publish(self, msg_type: str, **fields):
+        # Called from the acquisition path - encode once, then only deque appends per subscriber
+        if not self._subs:
+            return
+        line = (json.dumps({"type": msg_type, "ts": time.time(), **fields}) + "\n").encode()
+        for sub in self._subs:
+            sub.offer(line)
+
+    def _accept_loop(self):
+        server = self._server
+        while True:
+            try:
+                conn, addr = server.accept()
+            except OSError:
+                return
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sub = _Subscriber(conn, addr)
+            with self._lock:
+                # Copy-on-write so publish can iterate without taking the lock
+                self._subs = self._subs + [sub]
+            threading.Thread(target=sub.run, args=(self._remove,), daemon=True).start()
+
+    def _remove(self, sub: _Subscriber):
+        with self._lock:
+            self._subs = [s for s in self._subs if s is not sub]
+
+
+def subscribe(host: str = BUS_HOST, port: int = BUS_PORT):
+    # Yields decoded messages until FlowBench closes the bus
+    with socket.create_connection((host, port)) as conn:
+        buf = b""
+        while True:
+            chunk = conn.recv(65536)
+            if not chunk:
+                return
+            buf += chunk
+            *lines, buf = buf.split(b"\n")
+            for line in lines:
+                if line:
+                    yield json.loads(line)
+
+
+if __name__ == "__main__":
+    # Quick console subscriber: python bus.py [port]
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else BUS_PORT
+    try:
+        for msg in subscribe(port=port):
+            print(msg)
+    except ConnectionRefusedError:
+        print(f"[Bus] Nothing listening on {BUS_HOST}:{port} - is FlowBench running?")
+    except KeyboardInterrupt:
+        pass
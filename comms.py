@@ -1,29 +1,303 @@
+import asyncio
 import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+import numpy as np
 import requests
 from PyQt6.QtCore import QThread, pyqtSignal
 
-ESP32_BASE_URL = "http://192.168.4.1"
-TIMEOUT_S = 3
+ESP32_BASE_URL = os.environ.get("FLOWBENCH_URL", "http://192.168.4.1")  # Point at standin.py for bench-free testing
+TIMEOUT_S = 3             # Sequence uploads, and the upper bound for adaptive timeouts
+INITIAL_TIMEOUT_S = 1.0   # Used until a round trip has been measured
+MIN_TIMEOUT_S = 0.15
+FAIL_THRESHOLD = 3        # Consecutive failures before the circuit breaker opens
+BACKOFF_BASE_S = 0.25     # Recovery probes back off exponentially with full jitter...
+BACKOFF_MAX_S = 5.0       # ...up to this delay
+SAFETY_TIMEOUT_S = 0.5    # Panic/valve commands: short timeout, immediate retries, ignore the breaker
+SAFETY_RETRIES = 3
+TELEMETRY_STALL_S = 1.0   # Empty replies for this long while the link is UP - forget last_seq and resync
+
+STREAM_PORT = int(os.environ.get("FLOWBENCH_STREAM_PORT", 8081))   # firmware/main/stream.h
+STREAM_IDLE_TIMEOUT_S = 1.0   # No frames for this long (20 sample periods) means the stream is dead
+STREAM_BUFFER = 1024          # Decoded chunks held until the GUI drains them
+
+# Binary telemetry frames - must match TelemetryHeader/TelemetryFrame in firmware/main/pressures.h
+TELEMETRY_MAGIC = 0x4246
+TELEMETRY_VERSION = 2   # v2 frames carry the sequence status, v1 is still decoded
+HEADER_DTYPE = np.dtype([("magic", "<u2"), ("version", "u1"), ("channels", "u1")])
+SEQ_STATES = {1: "step", 2: "complete", 3: "aborted"}   # SeqState in firmware/main/sequence.h
+
+
+def frame_dtype(channels: int, version: int = TELEMETRY_VERSION) -> np.dtype:
+    fields = [("seq", "<u4"), ("t_ms", "<u4")]
+    if version >= 2:
+        fields += [("step", "<i2"), ("seq_state", "u1"), ("seq_event", "u1"), ("seq_event_t_ms", "<u4")]
+    return np.dtype(fields + [("values", "<f4", (channels,))])
+
+
+def sequence_events(frames: np.ndarray, last_event: int | None) -> tuple[list[tuple[int, dict]], int | None]:
+    # Finds sequence transitions in a batch of frames by comparing the wrapping event counter.
+    # Returns ([(frame index, event)], new last_event). The first frame ever seen only sets the baseline.
+    if frames.dtype.names is None or "seq_event" not in frames.dtype.names or not len(frames):
+        return [], last_event
+    counter = frames["seq_event"].astype(np.int16)
+    prev = np.empty_like(counter)
+    prev[0] = counter[0] if last_event is None else last_event
+    prev[1:] = counter[:-1]
+    events = []
+    for i in np.flatnonzero(counter != prev).tolist():
+        f = frames[i]
+        if int(f["seq_state"]) not in SEQ_STATES:
+            continue   # Counter reset by an ESP32 reboot
+        events.append((i, {
+            "event": SEQ_STATES[int(f["seq_state"])],
+            "step": int(f["step"]),
+            "t_ms": int(f["seq_event_t_ms"]),
+            # Transitions squeezed between two frames (steps shorter than a sample period)
+            "missed": (int(counter[i]) - int(prev[i])) % 256 - 1,
+        }))
+    return events, int(counter[-1])
+
+
+def decode_frames(body: bytes) -> np.ndarray:
+    # Zero-copy view of the packed frames - raises ValueError on a malformed body
+    if len(body) < HEADER_DTYPE.itemsize:
+        raise ValueError("Telemetry body shorter than header")
+    header = np.frombuffer(body, dtype=HEADER_DTYPE, count=1)[0]
+    if header["magic"] != TELEMETRY_MAGIC or not 1 <= header["version"] <= TELEMETRY_VERSION:
+        raise ValueError(f"Unknown telemetry header {header}")
+    dtype = frame_dtype(int(header["channels"]), int(header["version"]))
+    if (len(body) - HEADER_DTYPE.itemsize) % dtype.itemsize:
+        raise ValueError("Telemetry body is not a whole number of frames")
+    return np.frombuffer(body, dtype=dtype, offset=HEADER_DTYPE.itemsize)
+
+
+class LinkMonitor:
+    """Tracks round-trip times to the ESP32 and acts as a circuit breaker.
+    Timeouts follow the TCP retransmission estimator (srtt + 4 * rttvar). After FAIL_THRESHOLD
+    consecutive failures the link is marked DOWN, normal requests fail fast, and a background
+    thread probes for recovery with jittered exponential backoff."""
+
+    UP, DOWN, PROBING = "UP", "DOWN", "PROBING"
+
+    def __init__(self, probe):
+        self.state = self.UP
+        self.srtt = None
+        self.rttvar = None
+        self.failures = 0
+        self._probe = probe   # callable(timeout) -> bool
+        self._lock = threading.Lock()
+        self._probing = False   # A probe thread is running
+
+    @property
+    def timeout(self) -> float:
+        if self.srtt is None:
+            return INITIAL_TIMEOUT_S
+        return min(max(self.srtt + 4 * self.rttvar, MIN_TIMEOUT_S), TIMEOUT_S)
+
+    def allow(self) -> bool:
+        return self.state == self.UP
+
+    def record_success(self, rtt: float):
+        with self._lock:
+            if self.srtt is None:
+                self.srtt, self.rttvar = rtt, rtt / 2
+            else:
+                self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+                self.srtt = 0.875 * self.srtt + 0.125 * rtt
+            self.failures = 0
+            self.state = self.UP
+
+    def record_failure(self, timed_out: bool = False):
+        with self._lock:
+            if timed_out and self.rttvar is not None:
+                # Back the timeout off like a TCP RTO so a slow-but-alive link isn't starved
+                self.rttvar = min(self.rttvar * 2, TIMEOUT_S)
+            self.failures += 1
+            if self.state != self.UP or self.failures < FAIL_THRESHOLD:
+                return
+            self.state = self.DOWN
+            # A probe thread still backing off from an earlier outage carries on with this one
+            start_probe = not self._probing
+            self._probing = True
+        print(f"[Comms] Link DOWN after {self.failures} failures — probing for recovery")
+        if start_probe:
+            threading.Thread(target=self._probe_loop, daemon=True).start()
+
+    def _probe_loop(self):
+        attempt = 0
+        while True:
+            time.sleep(random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** attempt)))
+            with self._lock:
+                if self.state == self.UP:
+                    # A safety command got through while backing off
+                    self._probing = False
+                    return
+                self.state = self.PROBING
+            start = time.perf_counter()
+            if self._probe(TIMEOUT_S):
+                self.record_success(time.perf_counter() - start)
+                with self._lock:
+                    self._probing = False
+                print("[Comms] Link UP")
+                return
+            with self._lock:
+                if self.state == self.PROBING:
+                    self.state = self.DOWN
+            attempt += 1
+
+
+class TelemetryStream:
+    """Push telemetry client. Holds one long-lived GET on the ESP32 stream port and decodes
+    frames as they arrive, so each sample costs one-way latency instead of a request. Runs an
+    asyncio loop in a background thread and reconnects with jittered backoff."""
+
+    def __init__(self, host: str | None = None, port: int = STREAM_PORT):
+        self.host = host or urlsplit(ESP32_BASE_URL).hostname
+        self.port = port
+        self.connected = False
+        self.last_seq = None
+        self.frames_lost = 0
+        self._chunks = deque(maxlen=STREAM_BUFFER)
+        self._loop = None
+        self._task = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=asyncio.run, args=(self._main(),), daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._loop and self._task:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+
+    def drain(self) -> np.ndarray | None:
+        # Everything received since the last drain, oldest first
+        chunks = []
+        while self._chunks:
+            chunks.append(self._chunks.popleft())
+        if not chunks:
+            return None
+        return chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        attempt = 0
+        try:
+            while True:
+                try:
+                    await self._session()
+                    attempt = 0
+                except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+                    pass
+                finally:
+                    self.connected = False
+                await asyncio.sleep(random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** attempt)))
+                attempt += 1
+        except asyncio.CancelledError:
+            pass
+
+    async def _session(self):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), TIMEOUT_S)
+        try:
+            writer.write(f"GET /stream HTTP/1.1\r\nHost: {self.host}\r\n"
+                         f"Accept: application/octet-stream\r\n\r\n".encode())
+            await writer.drain()
+            status = await asyncio.wait_for(reader.readline(), TIMEOUT_S)
+            if b" 200 " not in status:
+                raise ValueError(f"Stream refused: {status!r}")
+            while await asyncio.wait_for(reader.readline(), TIMEOUT_S) not in (b"\r\n", b"\n", b""):
+                pass
+            header = decode_frames(await asyncio.wait_for(reader.readexactly(HEADER_DTYPE.itemsize), TIMEOUT_S))
+            dtype = header.dtype
+            self.connected = True
+            buf = b""
+            while True:
+                data = await asyncio.wait_for(reader.read(65536), STREAM_IDLE_TIMEOUT_S)
+                if not data:
+                    return
+                buf += data
+                whole = len(buf) - len(buf) % dtype.itemsize
+                if not whole:
+                    continue
+                frames = np.frombuffer(buf[:whole], dtype=dtype)
+                buf = buf[whole:]
+                first = int(frames["seq"][0])
+                if self.last_seq is not None and first > self.last_seq + 1:
+                    self.frames_lost += first - self.last_seq - 1
+                self.last_seq = int(frames["seq"][-1])
+                self._chunks.append(frames)
+        finally:
+            writer.close()
 
 
 class SendWorker(QThread):
-    succeeded = pyqtSignal()
+    succeeded = pyqtSignal(str)   # "unchanged", "delta" or "full"
     failed    = pyqtSignal(str)
 
     def __init__(self, payload: dict):
         super().__init__()
         self.payload = payload
 
-    def run(self):
-        url = f"{ESP32_BASE_URL}/sequence"
+    def _remote_state(self) -> dict | None:
+        # GET /sequence reports the hash of whatever the ESP32 currently has loaded
         try:
-            resp = requests.post(url, json=self.payload, timeout=TIMEOUT_S)
+            resp = requests.get(f"{ESP32_BASE_URL}/sequence", timeout=TIMEOUT_S)
             resp.raise_for_status()
-            data = resp.json()
-            if data.get("status") == "ok":
-                self.succeeded.emit()
+            return resp.json()
+        except Exception:
+            return None
+
+    def _delta_body(self, remote: dict) -> dict | None:
+        # Only steps whose hash differs from what the ESP32 holds are sent, keyed by index
+        if not remote.get("loaded") or not remote.get("hash"):
+            return None
+        old = remote.get("step_hashes") or []
+        new = self.payload["step_hashes"]
+        changed = [i for i, h in enumerate(new) if i >= len(old) or old[i] != h]
+        if not changed or len(changed) == len(new):
+            return None
+        return {
+            "base": remote["hash"],
+            "patch": [{"index": i, "step": self.payload["sequence"][i]} for i in changed],
+            "step_count": self.payload["step_count"],
+            "step_hashes": new,
+            "hash": self.payload["hash"],
+        }
+
+    def _post(self, body: dict) -> bool:
+        resp = requests.post(f"{ESP32_BASE_URL}/sequence", json=body, timeout=TIMEOUT_S)
+        resp.raise_for_status()
+        data = resp.json()
+        if data.get("status") != "ok":
+            raise ValueError(f"Unexpected response: {data}")
+        # Older firmware doesn't echo a hash, so only reject an explicit mismatch
+        return data.get("hash", self.payload["hash"]) == self.payload["hash"]
+
+    def run(self):
+        try:
+            remote = self._remote_state()
+            if remote and remote.get("loaded") and remote.get("hash") == self.payload["hash"]:
+                self.succeeded.emit("unchanged")
+                return
+            delta = self._delta_body(remote) if remote else None
+            if delta is not None:
+                try:
+                    if self._post(delta):
+                        self.succeeded.emit("delta")
+                        return
+                except (requests.exceptions.HTTPError, ValueError):
+                    pass   # Patch rejected (e.g. ESP32 rebooted in between) - fall back to a full upload
+            if self._post(self.payload):
+                self.succeeded.emit("full")
             else:
-                self.failed.emit(f"Unexpected response: {data}")
+                self.failed.emit("Hash mismatch after upload — try again.")
         except requests.exceptions.ConnectionError:
             self.failed.emit("No connection to ESP32.")
         except requests.exceptions.Timeout:
@@ -35,44 +309,115 @@ class SendWorker(QThread):
 
 
 class Comms:
-    def _send(self, endpoint: str, payload: dict) -> dict | None:
-        url = f"{ESP32_BASE_URL}{endpoint}"
+    def __init__(self):
+        self.link = LinkMonitor(self._probe)
+        self.last_seq = None     # Newest telemetry frame received
+        self.frames_lost = 0     # Frames the host fell too far behind to fetch
+        self._empty_since = None # First of a run of empty telemetry replies
+
+    def _probe(self, timeout: float) -> bool:
         try:
-            resp = requests.post(url, json=payload, timeout=TIMEOUT_S)
-            resp.raise_for_status()
-            return resp.json()
-        except requests.exceptions.ConnectionError:
-            print(f"[Comms] ERROR: Could not connect to ESP32 at {ESP32_BASE_URL}")
-            return None
-        except requests.exceptions.Timeout:
-            print(f"[Comms] ERROR: Request timed out after {TIMEOUT_S}s")
-            return None
-        except requests.exceptions.HTTPError as e:
-            print(f"[Comms] ERROR: HTTP {e.response.status_code} from ESP32")
-            return None
-        except Exception as e:
-            print(f"[Comms] ERROR: {e}")
+            requests.get(f"{ESP32_BASE_URL}/", timeout=timeout).raise_for_status()
+            return True
+        except Exception:
+            return False
+
+    def _send(self, endpoint: str, payload: dict, safety: bool = False) -> dict | None:
+        url = f"{ESP32_BASE_URL}{endpoint}"
+        if not safety and not self.link.allow():
+            print(f"[Comms] ERROR: Link {self.link.state}, {endpoint} not sent")
             return None
+        # Safety commands always get a short timeout and immediate retries, even if the breaker is open
+        timeout = SAFETY_TIMEOUT_S if safety else self.link.timeout
+        attempts = SAFETY_RETRIES if safety else 1
+        for _ in range(attempts):
+            start = time.perf_counter()
+            try:
+                resp = requests.post(url, json=payload, timeout=timeout)
+                self.link.record_success(time.perf_counter() - start)
+                resp.raise_for_status()
+                return resp.json()
+            except requests.exceptions.ConnectionError:
+                print(f"[Comms] ERROR: Could not connect to ESP32 at {ESP32_BASE_URL}")
+                self.link.record_failure()
+            except requests.exceptions.Timeout:
+                print(f"[Comms] ERROR: Request timed out after {timeout:.2f}s")
+                self.link.record_failure(timed_out=True)
+            except requests.exceptions.HTTPError as e:
+                print(f"[Comms] ERROR: HTTP {e.response.status_code} from ESP32")
+                return None
+            except Exception as e:
+                print(f"[Comms] ERROR: {e}")
+                return None
+        return None
 
     def read_pressures(self) -> list[float] | None:
-        # GET /pressures. ESP32 returns a JSON array of 4 pressure values
+        # Newest sample only - kept for scripts, everything goes through read_telemetry
+        frames = self.read_telemetry()
+        if frames is None or not len(frames):
+            return None
+        return frames["values"][-1].tolist()
+
+    def read_telemetry(self) -> np.ndarray | None:
+        # GET /pressures asking for binary frames since the last one seen. Falls back to a
+        # single JSON sample (seq/t_ms zeroed) if the ESP32 only speaks JSON.
+        if not self.link.allow():
+            return None
         url = f"{ESP32_BASE_URL}/pressures"
+        params = {} if self.last_seq is None else {"since": self.last_seq}
+        headers = {"Accept": "application/octet-stream, application/json;q=0.5"}
+        start = time.perf_counter()
         try:
-            resp = requests.get(url, timeout=TIMEOUT_S)
+            resp = requests.get(url, params=params, headers=headers, timeout=self.link.timeout)
+            self.link.record_success(time.perf_counter() - start)
             resp.raise_for_status()
+            if resp.headers.get("Content-Type", "").startswith("application/octet-stream"):
+                frames = decode_frames(resp.content)
+                self._track_seq(frames)
+                return frames
             data = resp.json()
-            if "pressures" in data:
-                return data["pressures"]
+            if "pressures" not in data:
+                return None
+            frames = np.zeros(1, dtype=frame_dtype(len(data["pressures"]), version=1))
+            frames["values"][0] = data["pressures"]
+            return frames
+        except requests.exceptions.Timeout:
+            self.link.record_failure(timed_out=True)
+            return None
+        except requests.exceptions.ConnectionError:
+            self.link.record_failure()
             return None
         except Exception:
             return None
 
+    def _track_seq(self, frames: np.ndarray):
+        # The ESP32 restarts seq from 0 when it reboots - a seq going backwards, or nothing new
+        # for TELEMETRY_STALL_S from firmware that still waits for the old number, means resync
+        if not len(frames):
+            now = time.perf_counter()
+            if self.last_seq is None:
+                return
+            if self._empty_since is None:
+                self._empty_since = now
+            elif now - self._empty_since >= TELEMETRY_STALL_S:
+                print(f"[Comms] No telemetry after seq {self.last_seq} for {TELEMETRY_STALL_S:g}s — resyncing")
+                self.last_seq = None
+                self._empty_since = None
+            return
+        self._empty_since = None
+        first = int(frames["seq"][0])
+        if self.last_seq is not None and first <= self.last_seq:
+            print(f"[Comms] Telemetry seq went back from {self.last_seq} to {first} — ESP32 restarted, resyncing")
+        elif self.last_seq is not None and first > self.last_seq + 1:
+            self.frames_lost += first - self.last_seq - 1
+        self.last_seq = int(frames["seq"][-1])
+
     def send_valve_command(self, valve_name: str, action: str) -> bool:
-        result = self._send("/valve", {"cmd": "SET_VALVE", "valve": valve_name, "action": action})
+        result = self._send("/valve", {"cmd": "SET_VALVE", "valve": valve_name, "action": action}, safety=True)
         return result is not None and result.get("status") == "ok"
 
     def send_panic(self) -> bool:
-        result = self._send("/panic", {"cmd": "PANIC"})
+        result = self._send("/panic", {"cmd": "PANIC"}, safety=True)
         return result is not None and result.get("status") == "ok"
 
     def run_sequence(self) -> bool:
@@ -1,7 +1,19 @@
+import hashlib
+import json
 import numpy as np
 from PyQt6.QtCore import QTimer
+from timeline import ExpectedTimeline
+from validation import check_sequence, step_json_size
 
 PROFILE_STEPS = 100
+HASH_LEN = 16   # Hex chars kept from the sha1 digest - must fit in SEQ_HASH_LEN on the ESP32
+
+
+def content_hash(obj):
+    # Canonical JSON so the same step always hashes the same regardless of dict ordering
+    blob = json.dumps(obj, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(blob.encode()).hexdigest()[:HASH_LEN]
+
 
 class ValveController:
     def __init__(self, valve_names, on_valve_state_changed=None, on_seq_status_changed=None, logger=None):
@@ -11,6 +23,8 @@ class ValveController:
         self.on_valve_state_changed = on_valve_state_changed
         self.on_seq_status_changed = on_seq_status_changed
         self.seq_steps = []
+        self._compiled = {}  # step widget -> (compiled step dict or None, step hash, JSON size)
+        self._timeline = (None, None)  # ((sequence hash, start states), ExpectedTimeline) of the last run
         self.seq_running = False
         self.sent_sequence = None
         self.sequence_sent = False
@@ -70,20 +84,71 @@ class ValveController:
     # Sequenced activation - Adding, removing steps and start sequence
     def set_steps(self, seq_steps):
         self.seq_steps = seq_steps
+        # Forget compiled steps whose widgets have been removed
+        self._compiled = {s: c for s, c in self._compiled.items() if s in seq_steps}
         self._reset_send_state()
 
+    def invalidate_step(self, step_widget):
+        # Called whenever a step's widgets change so only that step gets recompiled
+        self._compiled.pop(step_widget, None)
+        self._reset_send_state()
+
+    def compile_step(self, step_widget):
+        cached = self._compiled.get(step_widget)
+        if cached is not None:
+            return cached
+        step = step_widget.get_step()
+        compiled = None
+        if step["actions"]:
+            compiled = {
+                "actions": step["actions"],
+                # round, not int - e.g. 0.57 * 1000 is 569.99...
+                "duration_ms": None if step["hold"] else round(step["duration"] * 1000),
+                "hold": step["hold"],
+            }
+        cached = (compiled, content_hash(compiled), step_json_size(compiled)) if compiled else (None, None, 0)
+        self._compiled[step_widget] = cached
+        return cached
+
     def build_sequence_payload(self):
         steps = []
+        step_hashes = []
         for s in self.seq_steps:
-            step = s.get_step()
-            if not step["actions"]:
+            compiled, h, _ = self.compile_step(s)
+            if compiled is None:
                 continue
-            steps.append({
-                "actions": step["actions"],
-                "duration_ms": None if step["hold"] else int(step["duration"] * 1000),
-                "hold": step["hold"],
-            })
-        return {"sequence": steps, "step_count": len(steps)}
+            steps.append(compiled)
+            step_hashes.append(h)
+        # Sequence hash covers step order and content - the ESP32 stores it and reports it back
+        return {
+            "sequence": steps,
+            "step_count": len(steps),
+            "step_hashes": step_hashes,
+            "hash": content_hash(step_hashes),
+        }
+
+    def validate(self):
+        # Firmware limits and executed timing of the current steps - only edited steps are
+        # recompiled, so this is cheap enough to run on every edit
+        steps, labels, sizes = [], [], []
+        for i, s in enumerate(self.seq_steps):
+            compiled, _, size = self.compile_step(s)
+            if compiled is None:
+                continue
+            steps.append(compiled)
+            labels.append(f"Step {i + 1:02d}")
+            sizes.append(size)
+        return check_sequence(steps, labels, self.valve_names, sizes)
+
+    def expected_timeline(self):
+        # Expanded once per sent sequence and starting valve states - re-runs reuse it
+        if not self.sent_sequence:
+            return None
+        key = (self.sent_sequence["hash"], tuple(self.valve_states))
+        if self._timeline[0] != key:
+            timeline = ExpectedTimeline(self.sent_sequence["sequence"], self.valve_names, self.valve_states)
+            self._timeline = (key, timeline)
+        return self._timeline[1]
 
     def send_sequence(self):
         if not self.seq_steps:
@@ -95,6 +160,12 @@ class ValveController:
             if self.on_seq_status_changed:
                 self.on_seq_status_changed("No valves selected in any step.", "#ff6b35")
             return False
+        # Catch what the ESP32 would reject or truncate before spending an upload on it
+        report = self.validate()
+        if not report.ok:
+            if self.on_seq_status_changed:
+                self.on_seq_status_changed("\n".join(report.errors), "#ff3333")
+            return False
         self.sent_sequence = payload
         self.sequence_sent = True
         return True
@@ -105,7 +176,7 @@ class ValveController:
                 self.on_seq_status_changed("Send sequence first.", "#ff6b35")
             return False
         self.seq_running = True
-        self.seq_index = 0
+        self.seq_index = -1   # No step reported by the ESP32 yet
         if self.on_seq_status_changed:
             self.on_seq_status_changed(
                 f"Running {self.sent_sequence['step_count']} step(s) on ESP32...",
@@ -113,8 +184,40 @@ class ValveController:
             )
         return True
 
-    def _seq_next(self):
-        pass
+    def on_device_event(self, event):
+        # Sequence progress reported by the ESP32 in its telemetry frames
+        if event["event"] == "step":
+            self._seq_next(event["step"])
+        elif event["event"] == "complete":
+            self._seq_done()
+        elif event["event"] == "aborted":
+            self._seq_stop()
+            if self.on_seq_status_changed:
+                self.on_seq_status_changed("Sequence aborted on ESP32.", "#ff3333")
+
+    def step_valve_states(self, step):
+        # Valve states once the given step of the sent sequence has been applied
+        states = list(self.valve_states)
+        if not self.sent_sequence or not 0 <= step < len(self.sent_sequence["sequence"]):
+            return states
+        for a in self.sent_sequence["sequence"][step]["actions"]:
+            if a["valve"] not in self.valve_names:
+                continue
+            if a["action"] == "PROFILE":
+                open_ = bool(a["points"]) and a["points"][-1] > 0
+            else:
+                open_ = a["action"] == "OPEN"
+            states[self.valve_names.index(a["valve"])] = open_
+        return states
+
+    def _seq_next(self, step=None):
+        self.seq_running = True
+        self.seq_index = self.seq_index + 1 if step is None else step
+        if self.on_seq_status_changed and self.sent_sequence:
+            self.on_seq_status_changed(
+                f"Step {self.seq_index + 1}/{self.sent_sequence['step_count']} running on ESP32...",
+                "#00d4ff"
+            )
 
     def _seq_stop(self):
         self.seq_running = False
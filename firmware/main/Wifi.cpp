@@ -90,7 +90,38 @@ static esp_err_t sequence_handler(httpd_req_t *req)
     }
 
     led_set(true);   // LED on means sequence has been received
-    send_ok(req);
+
+    // Echo the stored hash so the host can confirm what was loaded
+    char body[64];
+    snprintf(body, sizeof(body), "{\"status\":\"ok\",\"hash\":\"%s\"}", sequence_hash());
+    httpd_resp_set_type(req, "application/json");
+    httpd_resp_sendstr(req, body);
+    return ESP_OK;
+}
+
+// Reports the hashes of the loaded sequence so the host can skip or delta uploads
+static esp_err_t sequence_state_handler(httpd_req_t *req)
+{
+    cJSON *root = cJSON_CreateObject();
+    cJSON_AddBoolToObject(root, "loaded", sequence_is_loaded());
+    cJSON_AddStringToObject(root, "hash", sequence_hash());
+
+    cJSON *hashes = cJSON_AddArrayToObject(root, "step_hashes");
+    int count = sequence_step_count();
+    for (int i = 0; i < count; i++)
+        cJSON_AddItemToArray(hashes, cJSON_CreateString(sequence_step_hash(i)));
+
+    char *body = cJSON_PrintUnformatted(root);
+    cJSON_Delete(root);
+    if (!body)
+    {
+        send_error(req, "Out of memory");
+        return ESP_FAIL;
+    }
+
+    httpd_resp_set_type(req, "application/json");
+    httpd_resp_sendstr(req, body);
+    cJSON_free(body);
     return ESP_OK;
 }
 
@@ -179,8 +210,45 @@ static esp_err_t panic_handler(httpd_req_t *req)
     return ESP_OK;
 }
 
+// Clients sending "Accept: application/octet-stream" get packed TelemetryFrames
+// (optionally ?since=<seq>), everyone else gets the latest sample as JSON
+static bool wants_binary(httpd_req_t *req)
+{
+    char accept[96];
+    if (httpd_req_get_hdr_value_str(req, "Accept", accept, sizeof(accept)) != ESP_OK)
+        return false;
+    return strstr(accept, "application/octet-stream") != nullptr;
+}
+
+static esp_err_t pressures_binary(httpd_req_t *req)
+{
+    static uint8_t body[sizeof(TelemetryHeader) + TELEMETRY_RING_LEN * sizeof(TelemetryFrame)];
+
+    bool     has_since = false;
+    uint32_t since     = 0;
+    char query[32], value[16];
+    if (httpd_req_get_url_query_str(req, query, sizeof(query)) == ESP_OK &&
+        httpd_query_key_value(query, "since", value, sizeof(value)) == ESP_OK)
+    {
+        has_since = true;
+        since     = strtoul(value, nullptr, 10);
+    }
+
+    TelemetryHeader header = { TELEMETRY_MAGIC, TELEMETRY_VERSION, NUM_CHANNELS };
+    memcpy(body, &header, sizeof(header));
+    int count = pressures_get_frames(has_since, since,
+                                     (TelemetryFrame *)(body + sizeof(header)), TELEMETRY_RING_LEN);
+
+    httpd_resp_set_type(req, "application/octet-stream");
+    httpd_resp_send(req, (const char *)body, sizeof(header) + count * sizeof(TelemetryFrame));
+    return ESP_OK;
+}
+
 static esp_err_t pressures_handler(httpd_req_t *req)
 {
+    if (wants_binary(req))
+        return pressures_binary(req);
+
     float values[NUM_CHANNELS];
     pressures_get(values);
 
@@ -235,6 +303,7 @@ void start_webserver()
     httpd_uri_t routes[] = {
         { .uri = "/",          .method = HTTP_GET,  .handler = root_handler      },
         { .uri = "/sequence",  .method = HTTP_POST, .handler = sequence_handler  },
+        { .uri = "/sequence",  .method = HTTP_GET,  .handler = sequence_state_handler },
         { .uri = "/run",       .method = HTTP_POST, .handler = run_handler       },
         { .uri = "/valve",     .method = HTTP_POST, .handler = valve_handler     },
         { .uri = "/panic",     .method = HTTP_POST, .handler = panic_handler     },
@@ -4,6 +4,7 @@
 #include "wifi.h"
 #include "valves.h"
 #include "pressures.h"
+#include "stream.h"
 
 extern "C" void app_main()
 {
@@ -12,4 +13,5 @@ extern "C" void app_main()
     pressures_init();
     wifi_init_ap();
     start_webserver();
+    stream_start();
 }
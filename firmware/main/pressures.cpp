@@ -1,4 +1,6 @@
 #include "pressures.h"
+#include "stream.h"
+#include "sequence.h"
 #include "esp_timer.h"
 #include "esp_random.h"
 #include "freertos/FreeRTOS.h"
@@ -16,6 +18,9 @@ static float              s_latest[NUM_CHANNELS] = {};
 static SemaphoreHandle_t  s_mutex                = nullptr;
 static esp_timer_handle_t s_timer                = nullptr;
 
+static TelemetryFrame     s_ring[TELEMETRY_RING_LEN] = {};
+static uint32_t           s_next_seq             = 0;   // Sequence number of the next frame written
+
 // RNG placeholder to simulate ADC reads of Pressure Transducers
 static void sample_callback(void *arg)
 {
@@ -27,9 +32,23 @@ static void sample_callback(void *arg)
         fresh[i] = BASES[i] + NOISES[i] * r;
     }
 
+    uint32_t t_ms = (uint32_t)(esp_timer_get_time() / 1000);
+    SequenceStatus status;
+    sequence_get_status(&status);
+
     xSemaphoreTakeFromISR(s_mutex, nullptr);
     memcpy(s_latest, fresh, sizeof(s_latest));
+    TelemetryFrame *frame = &s_ring[s_next_seq % TELEMETRY_RING_LEN];
+    frame->seq            = s_next_seq++;
+    frame->t_ms           = t_ms;
+    frame->step           = status.step;
+    frame->seq_state      = status.state;
+    frame->seq_event      = status.event_no;
+    frame->seq_event_t_ms = status.event_t_ms;
+    memcpy(frame->values, fresh, sizeof(frame->values));
     xSemaphoreGiveFromISR(s_mutex, nullptr);
+
+    stream_notify();
 }
 
 void pressures_init()
@@ -54,3 +73,23 @@ void pressures_get(float out[NUM_CHANNELS])
     memcpy(out, s_latest, sizeof(s_latest));
     xSemaphoreGive(s_mutex);
 }
+
+
+int pressures_get_frames(bool has_since, uint32_t since_seq, TelemetryFrame *out, int max)
+{
+    xSemaphoreTake(s_mutex, portMAX_DELAY);
+
+    uint32_t oldest = s_next_seq > TELEMETRY_RING_LEN ? s_next_seq - TELEMETRY_RING_LEN : 0;
+    uint32_t first  = has_since ? since_seq + 1 : (s_next_seq ? s_next_seq - 1 : 0);
+    if (first < oldest) first = oldest;   // Host fell behind the ring - it sees the gap in seq
+    // A since we haven't reached yet means the host is ahead of us, i.e. we rebooted and seq
+    // started again from 0 - send everything buffered so it sees seq go back and resyncs
+    if (has_since && since_seq >= s_next_seq) first = oldest;
+
+    int count = 0;
+    for (uint32_t seq = first; seq < s_next_seq && count < max; seq++)
+        out[count++] = s_ring[seq % TELEMETRY_RING_LEN];
+
+    xSemaphoreGive(s_mutex);
+    return count;
+}
\ No newline at end of file
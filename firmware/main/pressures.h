@@ -5,5 +5,34 @@
 #define NUM_CHANNELS     4
 #define SAMPLE_PERIOD_US 50000
 
+// Binary telemetry - every sample is also kept as a fixed-size frame in a ring buffer so
+// the host can fetch everything since the last sequence number it saw in one request.
+#define TELEMETRY_RING_LEN  64
+#define TELEMETRY_MAGIC     0x4246   // "FB" little-endian
+#define TELEMETRY_VERSION   2   // v2 adds the sequence status fields
+
+typedef struct __attribute__((packed))
+{
+    uint16_t magic;
+    uint8_t  version;
+    uint8_t  channels;
+} TelemetryHeader;
+
+typedef struct __attribute__((packed))
+{
+    uint32_t seq;
+    uint32_t t_ms;                  // Device time since boot
+    int16_t  step;                  // SequenceStatus at the time of the sample
+    uint8_t  seq_state;
+    uint8_t  seq_event;
+    uint32_t seq_event_t_ms;
+    float    values[NUM_CHANNELS];
+} TelemetryFrame;
+
 void pressures_init();
 void pressures_get(float out[NUM_CHANNELS]);
+
+// Copies frames newer than since_seq (oldest first) into out, returns the count.
+// With has_since false only the newest frame is returned. A since_seq at or past the next
+// frame to be written (host still counting from before a reboot) returns every buffered frame.
+int pressures_get_frames(bool has_since, uint32_t since_seq, TelemetryFrame *out, int max);
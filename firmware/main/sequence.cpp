@@ -4,6 +4,7 @@
 #include "freertos/FreeRTOS.h"
 #include "freertos/task.h"
 #include "esp_log.h"
+#include "esp_timer.h"
 #include <string.h>
 
 static const char *TAG = "sequence";
@@ -13,7 +14,25 @@ static bool            s_loaded          = false;
 static volatile bool   s_running         = false;
 static volatile bool   s_abort_requested = false;
 static TaskHandle_t    s_task_handle     = nullptr;
+static SequenceStatus  s_status          = { -1, SEQ_IDLE, 0, 0 };
+static portMUX_TYPE    s_status_mux      = portMUX_INITIALIZER_UNLOCKED;
 
+// Content hashes computed by the host - stored verbatim and reported back so
+// unchanged sequences/steps don't have to be re-sent
+static char            s_hash[SEQ_HASH_LEN]                   = "";
+static char            s_step_hashes[MAX_STEPS][SEQ_HASH_LEN] = {};
+
+
+static void set_status(int step, SeqState state)
+{
+    uint32_t t_ms = (uint32_t)(esp_timer_get_time() / 1000);
+    portENTER_CRITICAL(&s_status_mux);
+    s_status.step       = step;
+    s_status.state      = state;
+    s_status.event_no++;
+    s_status.event_t_ms = t_ms;
+    portEXIT_CRITICAL(&s_status_mux);
+}
 
 static void apply_actions(const SequenceStep *step)
 {
@@ -59,6 +78,7 @@ static void sequence_task(void *arg)
 
         const SequenceStep *step = &s_sequence.steps[i];
         ESP_LOGI(TAG, "Step %d/%d", i + 1, s_sequence.step_count);
+        set_status(i, SEQ_RUNNING);
 
         // Apply solenoid actions immediately and start servo profile if present
         apply_actions(step);
@@ -96,11 +116,13 @@ static void sequence_task(void *arg)
     if (s_abort_requested)
     {
         panic_close_all();
+        set_status(-1, SEQ_ABORTED);
         ESP_LOGW(TAG, "Sequence aborted");
     }
     else
     {
         led_set(false);
+        set_status(-1, SEQ_COMPLETE);
         ESP_LOGI(TAG, "Sequence complete");
     }
 
@@ -110,6 +132,121 @@ static void sequence_task(void *arg)
     vTaskDelete(nullptr);
 }
 
+static void parse_step(cJSON *step_json, SequenceStep *step)
+{
+    memset(step, 0, sizeof(*step));
+
+    cJSON *dur = cJSON_GetObjectItem(step_json, "duration_ms");
+    step->duration_ms = (dur && cJSON_IsNumber(dur)) ? (int)dur->valuedouble : 0;
+
+    cJSON *hold = cJSON_GetObjectItem(step_json, "hold");
+    step->hold = cJSON_IsTrue(hold);
+
+    cJSON *actions_json = cJSON_GetObjectItem(step_json, "actions");
+    int action_count = cJSON_IsArray(actions_json) ? cJSON_GetArraySize(actions_json) : 0;
+    if (action_count > MAX_ACTIONS_PER_STEP) action_count = MAX_ACTIONS_PER_STEP;
+    step->action_count = action_count;
+
+    for (int ai = 0; ai < action_count; ai++)
+    {
+        cJSON *action_json = cJSON_GetArrayItem(actions_json, ai);
+        ValveAction *action = &step->actions[ai];
+
+        cJSON *valve  = cJSON_GetObjectItem(action_json, "valve");
+        cJSON *act    = cJSON_GetObjectItem(action_json, "action");
+
+        if (valve && cJSON_IsString(valve))
+            strncpy(action->valve_name, valve->valuestring, MAX_VALVE_NAME_LEN - 1);
+
+        if (act && cJSON_IsString(act))
+        {
+            if (strcmp(act->valuestring, "OPEN") == 0)
+                action->type = ACTION_OPEN;
+            else if (strcmp(act->valuestring, "CLOSE") == 0)
+                action->type = ACTION_CLOSE;
+            else if (strcmp(act->valuestring, "PROFILE") == 0)
+            {
+                action->type = ACTION_PROFILE;
+
+                cJSON *interval = cJSON_GetObjectItem(action_json, "interval_ms");
+                action->interval_ms = (interval && cJSON_IsNumber(interval))
+                                     ? (int)interval->valuedouble : 10;
+
+                cJSON *points_json = cJSON_GetObjectItem(action_json, "points");
+                if (cJSON_IsArray(points_json))
+                {
+                    int pc = cJSON_GetArraySize(points_json);
+                    if (pc > MAX_PROFILE_POINTS) pc = MAX_PROFILE_POINTS;
+                    action->point_count = pc;
+                    for (int pi = 0; pi < pc; pi++)
+                    {
+                        cJSON *pt = cJSON_GetArrayItem(points_json, pi);
+                        action->points[pi] = cJSON_IsNumber(pt) ? (float)pt->valuedouble : 0.0f;
+                    }
+                }
+            }
+        }
+    }
+}
+
+static void store_hashes(cJSON *root)
+{
+    cJSON *hash = cJSON_GetObjectItem(root, "hash");
+    s_hash[0] = '\0';
+    if (cJSON_IsString(hash))
+        strncpy(s_hash, hash->valuestring, SEQ_HASH_LEN - 1);
+
+    memset(s_step_hashes, 0, sizeof(s_step_hashes));
+    cJSON *step_hashes = cJSON_GetObjectItem(root, "step_hashes");
+    int count = cJSON_IsArray(step_hashes) ? cJSON_GetArraySize(step_hashes) : 0;
+    if (count > s_sequence.step_count) count = s_sequence.step_count;
+    for (int i = 0; i < count; i++)
+    {
+        cJSON *h = cJSON_GetArrayItem(step_hashes, i);
+        if (cJSON_IsString(h))
+            strncpy(s_step_hashes[i], h->valuestring, SEQ_HASH_LEN - 1);
+    }
+}
+
+// Overwrite only the steps named in "patch" - the rest of s_sequence is kept as is
+static bool apply_patch(cJSON *root, cJSON *patch)
+{
+    cJSON *base  = cJSON_GetObjectItem(root, "base");
+    cJSON *count = cJSON_GetObjectItem(root, "step_count");
+
+    if (!s_loaded || !cJSON_IsString(base) || strcmp(base->valuestring, s_hash) != 0)
+    {
+        ESP_LOGW(TAG, "Patch base does not match loaded sequence");
+        return false;
+    }
+    if (!cJSON_IsNumber(count) || count->valueint < 1 || count->valueint > MAX_STEPS)
+    {
+        ESP_LOGE(TAG, "Patch has bad step_count");
+        return false;
+    }
+
+    int patch_count = cJSON_GetArraySize(patch);
+    for (int i = 0; i < patch_count; i++)
+    {
+        cJSON *entry = cJSON_GetArrayItem(patch, i);
+        cJSON *index = cJSON_GetObjectItem(entry, "index");
+        cJSON *step  = cJSON_GetObjectItem(entry, "step");
+        if (!cJSON_IsNumber(index) || index->valueint < 0 || index->valueint >= count->valueint || !cJSON_IsObject(step))
+        {
+            // Sequence is now partly patched - force the host to do a full upload
+            ESP_LOGE(TAG, "Bad patch entry %d", i);
+            s_loaded  = false;
+            s_hash[0] = '\0';
+            return false;
+        }
+        parse_step(step, &s_sequence.steps[index->valueint]);
+    }
+
+    s_sequence.step_count = count->valueint;
+    ESP_LOGI(TAG, "Patched %d of %d step(s)", patch_count, s_sequence.step_count);
+    return true;
+}
+
 bool sequence_load(const char *json_buf)
 {
     if (s_running)
@@ -125,6 +262,15 @@ bool sequence_load(const char *json_buf)
         return false;
     }
 
+    cJSON *patch = cJSON_GetObjectItem(root, "patch");
+    if (cJSON_IsArray(patch))
+    {
+        bool ok = apply_patch(root, patch);
+        if (ok) store_hashes(root);
+        cJSON_Delete(root);
+        return ok;
+    }
+
     cJSON *seq_array = cJSON_GetObjectItem(root, "sequence");
     if (!cJSON_IsArray(seq_array))
     {
@@ -139,63 +285,9 @@ bool sequence_load(const char *json_buf)
     s_sequence.step_count = step_count;
 
     for (int si = 0; si < step_count; si++)
-    {
-        cJSON *step_json = cJSON_GetArrayItem(seq_array, si);
-        SequenceStep *step = &s_sequence.steps[si];
-
-        cJSON *dur = cJSON_GetObjectItem(step_json, "duration_ms");
-        step->duration_ms = (dur && cJSON_IsNumber(dur)) ? (int)dur->valuedouble : 0;
-
-        cJSON *hold = cJSON_GetObjectItem(step_json, "hold");
-        step->hold = cJSON_IsTrue(hold);
-
-        cJSON *actions_json = cJSON_GetObjectItem(step_json, "actions");
-        int action_count = cJSON_IsArray(actions_json) ? cJSON_GetArraySize(actions_json) : 0;
-        if (action_count > MAX_ACTIONS_PER_STEP) action_count = MAX_ACTIONS_PER_STEP;
-        step->action_count = action_count;
-
-        for (int ai = 0; ai < action_count; ai++)
-        {
-            cJSON *action_json = cJSON_GetArrayItem(actions_json, ai);
-            ValveAction *action = &step->actions[ai];
-
-            cJSON *valve  = cJSON_GetObjectItem(action_json, "valve");
-            cJSON *act    = cJSON_GetObjectItem(action_json, "action");
-
-            if (valve && cJSON_IsString(valve))
-                strncpy(action->valve_name, valve->valuestring, MAX_VALVE_NAME_LEN - 1);
-
-            if (act && cJSON_IsString(act))
-            {
-                if (strcmp(act->valuestring, "OPEN") == 0)
-                    action->type = ACTION_OPEN;
-                else if (strcmp(act->valuestring, "CLOSE") == 0)
-                    action->type = ACTION_CLOSE;
-                else if (strcmp(act->valuestring, "PROFILE") == 0)
-                {
-                    action->type = ACTION_PROFILE;
-
-                    cJSON *interval = cJSON_GetObjectItem(action_json, "interval_ms");
-                    action->interval_ms = (interval && cJSON_IsNumber(interval))
-                                         ? (int)interval->valuedouble : 10;
-
-                    cJSON *points_json = cJSON_GetObjectItem(action_json, "points");
-                    if (cJSON_IsArray(points_json))
-                    {
-                        int pc = cJSON_GetArraySize(points_json);
-                        if (pc > MAX_PROFILE_POINTS) pc = MAX_PROFILE_POINTS;
-                        action->point_count = pc;
-                        for (int pi = 0; pi < pc; pi++)
-                        {
-                            cJSON *pt = cJSON_GetArrayItem(points_json, pi);
-                            action->points[pi] = cJSON_IsNumber(pt) ? (float)pt->valuedouble : 0.0f;
-                        }
-                    }
-                }
-            }
-        }
-    }
+        parse_step(cJSON_GetArrayItem(seq_array, si), &s_sequence.steps[si]);
 
+    store_hashes(root);
     cJSON_Delete(root);
     s_loaded = true;
     ESP_LOGI(TAG, "Loaded %d step(s)", s_sequence.step_count);
@@ -229,3 +321,19 @@ void sequence_abort()
 
 bool sequence_is_loaded()  { return s_loaded; }
 bool sequence_is_running() { return s_running; }
+
+void sequence_get_status(SequenceStatus *out)
+{
+    portENTER_CRITICAL(&s_status_mux);
+    *out = s_status;
+    portEXIT_CRITICAL(&s_status_mux);
+}
+
+const char *sequence_hash()  { return s_hash; }
+int sequence_step_count()    { return s_loaded ? s_sequence.step_count : 0; }
+
+const char *sequence_step_hash(int index)
+{
+    if (index < 0 || index >= MAX_STEPS) return "";
+    return s_step_hashes[index];
+}
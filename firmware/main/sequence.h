@@ -1,11 +1,13 @@
 #pragma once
 
 #include <stdbool.h>
+#include <stdint.h>
 
 #define MAX_STEPS            32
 #define MAX_ACTIONS_PER_STEP 4
 #define MAX_PROFILE_POINTS   200
 #define MAX_VALVE_NAME_LEN   32
+#define SEQ_HASH_LEN         17   // 16 hex chars from the host + terminator
 
 typedef enum
 {
@@ -38,6 +40,26 @@ typedef struct
     int          step_count;
 } Sequence;
 
+typedef enum
+{
+    SEQ_IDLE,
+    SEQ_RUNNING,
+    SEQ_COMPLETE,
+    SEQ_ABORTED,
+} SeqState;
+
+// Progress of the running sequence - copied into every telemetry frame so the host
+// sees step transitions and completion without any extra requests
+typedef struct
+{
+    int16_t  step;          // Step currently executing, -1 when not running
+    uint8_t  state;         // SeqState
+    uint8_t  event_no;      // Incremented (wrapping) on every transition
+    uint32_t event_t_ms;    // Device time of the latest transition
+} SequenceStatus;
+
+// Accepts either a full {"sequence": [...]} upload or a {"patch": [...]} delta
+// against the currently loaded sequence (must name it via "base").
 bool sequence_load(const char *json_buf);
 
 bool sequence_run();
@@ -46,3 +68,9 @@ void sequence_abort();
 
 bool sequence_is_loaded();
 bool sequence_is_running();
+
+void sequence_get_status(SequenceStatus *out);
+
+const char *sequence_hash();
+const char *sequence_step_hash(int index);
+int         sequence_step_count();
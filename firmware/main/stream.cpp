@@ -0,0 +1,157 @@
+#include "stream.h"
+#include "pressures.h"
+#include "freertos/FreeRTOS.h"
+#include "freertos/task.h"
+#include "lwip/sockets.h"
+#include "esp_log.h"
+#include <string.h>
+
+static const char *TAG = "stream";
+
+static TaskHandle_t s_task_handle = nullptr;
+
+// A client that vanishes without a FIN (Wi-Fi dropped, laptop asleep) must not hold the
+// single stream task - sends give up after this long and keepalive probes find dead peers
+#define STREAM_SEND_TIMEOUT_MS 1000
+#define STREAM_KEEPALIVE_IDLE_S  2
+#define STREAM_KEEPALIVE_INTVL_S 1
+#define STREAM_KEEPALIVE_COUNT   3
+
+static const char RESPONSE_HEAD[] =
+    "HTTP/1.1 200 OK\r\n"
+    "Content-Type: application/octet-stream\r\n"
+    "Cache-Control: no-cache\r\n"
+    "Connection: close\r\n"
+    "\r\n";
+
+static bool send_all(int sock, const void *data, size_t len)
+{
+    const char *p = (const char *)data;
+    while (len > 0)
+    {
+        int sent = send(sock, p, len, 0);
+        if (sent <= 0) return false;
+        p   += sent;
+        len -= sent;
+    }
+    return true;
+}
+
+// Discard the request - any GET on this port is treated as a stream request
+static void skip_request(int sock)
+{
+    char c;
+    int  matched = 0;   // Progress through "\r\n\r\n"
+    while (matched < 4)
+    {
+        if (recv(sock, &c, 1, 0) <= 0) return;
+        matched = (c == (matched % 2 == 0 ? '\r' : '\n')) ? matched + 1 : (c == '\r' ? 1 : 0);
+    }
+}
+
+static void configure_client(int sock)
+{
+    int yes = 1;
+    setsockopt(sock, IPPROTO_TCP, TCP_NODELAY, &yes, sizeof(yes));
+
+    timeval timeout = { STREAM_SEND_TIMEOUT_MS / 1000, (STREAM_SEND_TIMEOUT_MS % 1000) * 1000 };
+    setsockopt(sock, SOL_SOCKET, SO_SNDTIMEO, &timeout, sizeof(timeout));
+    setsockopt(sock, SOL_SOCKET, SO_RCVTIMEO, &timeout, sizeof(timeout));   // For skip_request
+
+    int idle = STREAM_KEEPALIVE_IDLE_S, intvl = STREAM_KEEPALIVE_INTVL_S, count = STREAM_KEEPALIVE_COUNT;
+    setsockopt(sock, SOL_SOCKET, SO_KEEPALIVE, &yes, sizeof(yes));
+    setsockopt(sock, IPPROTO_TCP, TCP_KEEPIDLE, &idle, sizeof(idle));
+    setsockopt(sock, IPPROTO_TCP, TCP_KEEPINTVL, &intvl, sizeof(intvl));
+    setsockopt(sock, IPPROTO_TCP, TCP_KEEPCNT, &count, sizeof(count));
+}
+
+// True if another client is waiting in the listen backlog - only one can be served, and a
+// reconnecting host means the current connection is most likely dead
+static bool client_waiting(int listener)
+{
+    fd_set fds;
+    FD_ZERO(&fds);
+    FD_SET(listener, &fds);
+    timeval now = { 0, 0 };
+    return select(listener + 1, &fds, nullptr, nullptr, &now) > 0;
+}
+
+static void serve_client(int listener, int sock)
+{
+    static TelemetryFrame frames[TELEMETRY_RING_LEN];
+
+    skip_request(sock);
+
+    TelemetryHeader header = { TELEMETRY_MAGIC, TELEMETRY_VERSION, NUM_CHANNELS };
+    if (!send_all(sock, RESPONSE_HEAD, strlen(RESPONSE_HEAD)) || !send_all(sock, &header, sizeof(header)))
+        return;
+
+    bool     has_since = false;
+    uint32_t since     = 0;
+    while (true)
+    {
+        // Woken by every new sample, the timeout only guards against a missed notify
+        ulTaskNotifyTake(pdTRUE, pdMS_TO_TICKS(500));
+
+        if (client_waiting(listener))
+        {
+            ESP_LOGW(TAG, "New stream client waiting - dropping the current one");
+            return;
+        }
+
+        int count = pressures_get_frames(has_since, since, frames, TELEMETRY_RING_LEN);
+        if (count == 0) continue;
+        if (!send_all(sock, frames, count * sizeof(TelemetryFrame)))
+        {
+            ESP_LOGW(TAG, "Stream send failed or timed out");
+            return;
+        }
+        has_since = true;
+        since     = frames[count - 1].seq;
+    }
+}
+
+static void stream_task(void *arg)
+{
+    int listener = socket(AF_INET, SOCK_STREAM, IPPROTO_TCP);
+    int yes = 1;
+    setsockopt(listener, SOL_SOCKET, SO_REUSEADDR, &yes, sizeof(yes));
+
+    sockaddr_in addr = {};
+    addr.sin_family      = AF_INET;
+    addr.sin_port        = htons(STREAM_PORT);
+    addr.sin_addr.s_addr = htonl(INADDR_ANY);
+
+    if (bind(listener, (sockaddr *)&addr, sizeof(addr)) != 0 || listen(listener, 1) != 0)
+    {
+        ESP_LOGE(TAG, "Failed to listen on port %d", STREAM_PORT);
+        close(listener);
+        s_task_handle = nullptr;
+        vTaskDelete(nullptr);
+        return;
+    }
+    ESP_LOGI(TAG, "Telemetry stream on port %d", STREAM_PORT);
+
+    while (true)
+    {
+        int sock = accept(listener, nullptr, nullptr);
+        if (sock < 0) continue;
+
+        configure_client(sock);
+        ESP_LOGI(TAG, "Stream client connected");
+        serve_client(listener, sock);
+        close(sock);
+        ESP_LOGI(TAG, "Stream client disconnected");
+    }
+}
+
+void stream_start()
+{
+    xTaskCreate(stream_task, "stream_task", 4096, nullptr, 4, &s_task_handle);
+}
+
+void stream_notify()
+{
+    if (s_task_handle)
+        xTaskNotifyGive(s_task_handle);
+}
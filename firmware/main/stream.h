@@ -0,0 +1,12 @@
+#pragma once
+
+#define STREAM_PORT 8081
+
+// Push telemetry: a plain HTTP GET on STREAM_PORT gets a never-ending
+// application/octet-stream body - one TelemetryHeader, then every
+// TelemetryFrame as soon as it is sampled. Runs in its own task so the
+// httpd on port 80 is never blocked.
+void stream_start();
+
+// Called from the sample callback to wake the stream task
+void stream_notify();
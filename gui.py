@@ -1,3 +1,4 @@
+import os
 import sys
 import random
 import math
@@ -9,17 +10,24 @@ from PyQt6.QtWidgets import (
     QDoubleSpinBox, QComboBox, QSizePolicy, QScrollArea
 )
 from PyQt6.QtCore import QTimer, Qt, pyqtSignal
-from PyQt6.QtGui import QFont
+from PyQt6.QtGui import QFont, QKeySequence, QShortcut
 import pyqtgraph as pg
 import numpy as np
 import matplotlib.pyplot as plt
-from logger import Logger
+from logger import Logger, LOG_DIR
 from control import ValveController
-from comms import Comms, SendWorker
+from comms import Comms, SendWorker, TelemetryStream
+from timeindex import RecordingIndex
+from bus import TelemetryBus
+from sources import LiveSource
+from profiling import ProfileCapture
+from stats import ChannelStats
+from timeline import DeviationTracker
 
 # config - tweak these as needed
 MAX_POINTS = 200 # Amount of points in realtime graph (MAX_POINTS/(1000/UPDATE_RATE_MS)) is timeframe for realtime graph
 UPDATE_RATE_MS = 50  # In ms, so 50ms = 20 Hz
+LIVE_INDEX_TRIM_AT = 2 * MAX_POINTS  # Live index is cut back to the graph window once it holds this many samples
 CHANNELS = [
     {"name": "P1 - Pressurant",     "unit": "bar", "color": "#00d4ff", "base": 50.0, "noise": 4.3},
     {"name": "P2 - Oxidiser Tank",  "unit": "bar", "color": "#ff6b35", "base": 60.5,  "noise": 7.2},
@@ -28,6 +36,10 @@ CHANNELS = [
 ]
 VALVES = ["Solenoid Valve 1", "Solenoid Valve 2", "Servo Valve 1"]
 VALVE_COLORS = ["#00d4ff", "#ff6b35", "#7fff6b"]
+PROFILE_DURATION_S = 10   # Length of an F9 profiling capture
+STATS_WINDOWS_S = [1, 5, 30]   # Rolling statistics windows shown beside each graph
+STATS_UPDATE_TICKS = 5         # Stats labels refresh every 5 ticks (4 Hz at 20 Hz updates)
+STATS_LOG_PERIOD_S = 1.0       # Rolling stats written to the recording's stats CSVs this often while recording (None to disable)
 
 # UI - Toggle switch for the valve controls
 class ToggleSwitch(QWidget):
@@ -88,6 +100,7 @@ class ValveCheckBox(QWidget):
 # Logic - Sequencer Activation - Valve Selection and duration
 class SequenceStep(QFrame):
     removed = pyqtSignal(object)
+    changed = pyqtSignal(object)
     def __init__(self, step_num, controller):
         super().__init__()
         self.controller = controller
@@ -127,6 +140,8 @@ class SequenceStep(QFrame):
                 action_cb.setFixedWidth(80)
             row.addWidget(action_cb)
             outer.addLayout(row)
+            cb.stateChanged.connect(lambda _: self.changed.emit(self))
+            action_cb.currentTextChanged.connect(lambda _: self.changed.emit(self))
             self.valve_actions.append((cb, action_cb))
         # Duration of Valve activation
         bot = QHBoxLayout()
@@ -140,6 +155,7 @@ class SequenceStep(QFrame):
         self.duration_spin.setDecimals(2)
         self.duration_spin.setFixedWidth(85)
         self.duration_spin.setSuffix(" s")
+        self.duration_spin.valueChanged.connect(lambda _: self.changed.emit(self))
         self.inf_btn = QPushButton("∞")
         self.inf_btn.setFixedSize(28, 28)
         self.inf_btn.setObjectName("btn_inf")
@@ -162,6 +178,7 @@ class SequenceStep(QFrame):
     def _toggle_inf(self, checked):
         self.duration_spin.setEnabled(not checked)
         self.duration_spin.setStyleSheet("color: #333;" if checked else "")
+        self.changed.emit(self)
     def _show_profile_preview(self):
         # Find whichever servo profile is currently selected in this step
         profile = "Linear"
@@ -212,7 +229,7 @@ class SequenceStep(QFrame):
 
 # UI - Main window integrating everything together and program for realtime graph updating
 class FlowBench(QMainWindow):
-    def __init__(self):
+    def __init__(self, source=None, profile_s=None):
         super().__init__()
         self.setWindowTitle("FlowBench")
         self.setMinimumSize(1200, 760)
@@ -220,9 +237,30 @@ class FlowBench(QMainWindow):
         self.buffers = [deque([0.0] * MAX_POINTS, maxlen=MAX_POINTS) for _ in CHANNELS]
         self.t_count = 0.0
         self.seq_steps = []
+        self.channel_stats = [ChannelStats(STATS_WINDOWS_S) for _ in CHANNELS]
+        self._stats_tick = 0
+        self._stats_logged_at = 0.0
         self.logger = Logger()
+        if STATS_LOG_PERIOD_S:
+            self.logger.stats_columns = [f"{ch['name'].split(' ')[0]}_{w:g}s_{f}"
+                                         for ch in CHANNELS for w in STATS_WINDOWS_S for f in ChannelStats.FIELDS]
         self.comms = Comms()
+        # Where samples come from - the ESP32 by default, or e.g. a ReplaySource of a recorded run
+        self.source = source or LiveSource(self.comms, TelemetryStream())
+        if not isinstance(self.source, LiveSource):
+            self.setWindowTitle(f"FlowBench — {self.source.name}")
+        # Republishes samples and valve/sequence events for other local tools
+        self.bus = TelemetryBus()
+        self.bus.start()
         self._send_worker = None
+        # Live index on the graph time axis - valve event markers are looked up from it each tick
+        self.live_index = RecordingIndex([ch["name"] for ch in CHANNELS], VALVES)
+        self.event_markers = {}  # event index -> one InfiniteLine per plot
+        # Expected timeline of the running sequence and how far the run deviates from it
+        self.deviation = DeviationTracker(len(CHANNELS))
+        self.expected_markers = {}  # expected transition index -> one InfiniteLine per plot
+        self._responses_drawn = 0
+        self._deviation_shown = None
         self._build_ui()
         self.controller = ValveController(
             valve_names=VALVES,
@@ -231,10 +269,19 @@ class FlowBench(QMainWindow):
             logger=self.logger,
         )
         self.setStyleSheet(self._stylesheet())
+        self.source.start()
         self.data_timer = QTimer()
         self.data_timer.setInterval(UPDATE_RATE_MS)
         self.data_timer.timeout.connect(self._update)
         self.data_timer.start()
+        # F9 starts a profiling capture (and stops it early if pressed again)
+        self.profiler = ProfileCapture(LOG_DIR)
+        self.profile_timer = QTimer()
+        self.profile_timer.setSingleShot(True)
+        self.profile_timer.timeout.connect(self._profile_stop)
+        QShortcut(QKeySequence("F9"), self).activated.connect(self._toggle_profile)
+        if profile_s:
+            self._profile_start(profile_s)
 
     # Builds the main UI layout - Integrating all elements
     def _build_ui(self):
@@ -264,17 +311,27 @@ class FlowBench(QMainWindow):
         lbl.setObjectName("titleLbl")
         lbl.setAlignment(Qt.AlignmentFlag.AlignCenter)
         h.addWidget(lbl, stretch=1)
+        # ESP32 link state from Comms' circuit breaker
+        self.link_lbl = QLabel("● LINK UP")
+        self.link_lbl.setFont(QFont("Courier New", 9, QFont.Weight.Bold))
+        self.link_lbl.setFixedWidth(130)
+        self.link_lbl.setAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        self.link_lbl.setStyleSheet("color: #7fff6b;")
+        self._link_state = None
+        h.addWidget(self.link_lbl)
         return frame
     def _graphs_layout(self):
         grid = QGridLayout()
         grid.setSpacing(8)
         self.curves = []
         self.val_labels = []
+        self.stats_labels = []
         self.plots = []
         for i, ch in enumerate(CHANNELS):
-            container, curve, val_lbl = self._make_graph_box(ch)
+            container, curve, val_lbl, stats_lbl = self._make_graph_box(ch)
             self.curves.append(curve)
             self.val_labels.append(val_lbl)
+            self.stats_labels.append(stats_lbl)
             grid.addWidget(container, i // 2, i % 2)
         combined = QFrame()
         combined.setObjectName("graphBox")
@@ -305,6 +362,23 @@ class FlowBench(QMainWindow):
         for ch in CHANNELS:
             c = self.combined_plot.plot(pen=pg.mkPen(color=ch["color"], width=1.8))
             self.combined_curves.append(c)
+        # Expected servo position (0 -> 1) during a run, on its own right-hand axis
+        plot_item = self.combined_plot.getPlotItem()
+        self.servo_view = pg.ViewBox()
+        plot_item.scene().addItem(self.servo_view)
+        plot_item.getAxis("right").linkToView(self.servo_view)
+        plot_item.getAxis("right").setTextPen(pg.mkPen("#888"))
+        plot_item.setLabel("right", "servo expected")
+        plot_item.hideAxis("right")
+        self.servo_view.setXLink(plot_item)
+        self.servo_view.setYRange(0.0, 1.0)
+        self.servo_view.setMouseEnabled(y=False)
+        plot_item.vb.sigResized.connect(lambda: self.servo_view.setGeometry(plot_item.vb.sceneBoundingRect()))
+        self.expected_servo = pg.PlotDataItem(pen=pg.mkPen(color=VALVE_COLORS[VALVES.index("Servo Valve 1")], width=1, style=Qt.PenStyle.DotLine))
+        self.servo_view.addItem(self.expected_servo)
+        # Observed pressure responses to the expected transitions
+        self.response_points = pg.ScatterPlotItem(symbol="x", size=10)
+        self.combined_plot.addItem(self.response_points)
         vbox.addWidget(self.combined_plot)
         grid.addWidget(combined, 2, 0, 1, 2)
         grid.setColumnStretch(0, 1)
@@ -340,9 +414,19 @@ class FlowBench(QMainWindow):
         plot.getAxis("bottom").setTextPen(pg.mkPen("#888"))
         plot.enableAutoRange(axis='y')
         curve = plot.plot(pen=pg.mkPen(color=ch["color"], width=1.8))
-        vbox.addWidget(plot)
+        # Rolling statistics beside the graph
+        stats_lbl = QLabel("")
+        stats_lbl.setFont(QFont("Courier New", 8))
+        stats_lbl.setStyleSheet("color: #888;")
+        stats_lbl.setFixedWidth(120)
+        stats_lbl.setAlignment(Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft)
+        row = QHBoxLayout()
+        row.setSpacing(6)
+        row.addWidget(plot, stretch=1)
+        row.addWidget(stats_lbl)
+        vbox.addLayout(row)
         self.plots.append(plot)
-        return container, curve, val_lbl
+        return container, curve, val_lbl, stats_lbl
     # Control panel - Manual Valve actuation + Sequenced actuation
     def _control_panel(self):
         panel = QFrame()
@@ -410,6 +494,12 @@ class FlowBench(QMainWindow):
             QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical { height: 0; }
         """)
         vbox.addWidget(scroll, stretch=1)
+        # Live check against the firmware limits and the timing the ESP32 will actually run
+        self.validation_lbl = QLabel("")
+        self.validation_lbl.setFont(QFont("Courier New", 8))
+        self.validation_lbl.setStyleSheet("color: #888;")
+        self.validation_lbl.setWordWrap(True)
+        vbox.addWidget(self.validation_lbl)
         btn_add = QPushButton("+ ADD STEP")
         btn_add.setObjectName("btn_add")
         btn_add.clicked.connect(self._add_step)
@@ -434,9 +524,17 @@ class FlowBench(QMainWindow):
         self.seq_status.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.seq_status.setWordWrap(True)
         vbox.addWidget(self.seq_status)
+        self.deviation_lbl = QLabel("")
+        self.deviation_lbl.setFont(QFont("Courier New", 8))
+        self.deviation_lbl.setStyleSheet("color: #888;")
+        self.deviation_lbl.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        vbox.addWidget(self.deviation_lbl)
         return panel
     # Manual Valve activation toggle logic
     def _on_valve_state_changed(self, idx, state):
+        self._show_valve_state(idx, state)
+        self.comms.send_valve_command(VALVES[idx], "OPEN" if state else "CLOSE")
+    def _show_valve_state(self, idx, state):
         lbl = self.valve_status_labels[idx]
         if state:
             lbl.setText("OPEN")
@@ -446,13 +544,66 @@ class FlowBench(QMainWindow):
             lbl.setStyleSheet("color: #333;")
         self.valve_switches[idx].state = state
         self.valve_switches[idx].update()
-        self.comms.send_valve_command(VALVES[idx], "OPEN" if state else "CLOSE")
+        self.live_index.append_valve_states(self.t_count, self.controller.valve_states)
+        self.bus.publish("valve", t=self.t_count, valve=VALVES[idx], state="OPEN" if state else "CLOSED")
+    def _apply_replayed_valves(self, states):
+        # Valve changes from a recording - shown and logged, but never commanded on the ESP32
+        for idx, state in enumerate(states):
+            if state != self.controller.valve_states[idx]:
+                self.controller.valve_states[idx] = state
+                self._show_valve_state(idx, state)
+        self.logger.log_valve_state(self.controller.valve_states)
+    def _on_sequence_event(self, event):
+        # Step/completion reported by the ESP32 - valve indicators follow the running sequence
+        # without commanding anything, and the transition is logged with its device time
+        if event.get("missed", 0) > 0:
+            self._log_skipped_steps(event)
+        states = self.controller.valve_states
+        if event["event"] == "step":
+            self.deviation.on_step(event["step"], self.t_count, event["t_ms"])
+            states = self.controller.step_valve_states(event["step"])
+            for idx, state in enumerate(states):
+                if state != self.controller.valve_states[idx]:
+                    self.controller.valve_states[idx] = state
+                    self._show_valve_state(idx, state)
+        label = f"step {event['step'] + 1}" if event["event"] == "step" else event["event"]
+        self.logger.log_valve_state(states, event=label, device_t_ms=event["t_ms"])
+        self.controller.on_device_event(event)
+        if event["event"] in ("complete", "aborted"):
+            self.btn_send.setEnabled(True)
+            self.btn_run.setEnabled(self.controller.sequence_sent)
+        self.bus.publish("sequence", t=self.t_count, **event)
+    def _log_skipped_steps(self, event):
+        # Steps that started and ended between two frames have no boundary times, but a
+        # "skipped steps" row marks the gap in the log and the valve states they left still apply
+        missed = event["missed"]
+        if event["event"] == "step":
+            skipped = list(range(max(event["step"] - missed, 0), event["step"]))
+        else:
+            count = self.controller.sent_sequence["step_count"] if self.controller.sent_sequence else 0
+            first = self.controller.seq_index + 1
+            skipped = list(range(first, min(first + missed, count)))
+        for step in skipped:
+            for idx, state in enumerate(self.controller.step_valve_states(step)):
+                if state != self.controller.valve_states[idx]:
+                    self.controller.valve_states[idx] = state
+                    self._show_valve_state(idx, state)
+        if not skipped:
+            label = f"skipped {missed} transition(s)"
+        elif len(skipped) == 1:
+            label = f"skipped step {skipped[0] + 1}"
+        else:
+            label = f"skipped steps {skipped[0] + 1}-{skipped[-1] + 1}"
+        self.logger.log_valve_state(self.controller.valve_states, event=label)
+        self.deviation.on_skipped(len(skipped) or missed)
+        self.bus.publish("sequence", t=self.t_count, event="skipped", steps=[s + 1 for s in skipped], missed=missed)
     def _on_seq_status_changed(self, message, color):
         self.seq_status.setText(message)
         self.seq_status.setStyleSheet(f"color: {color};")
     def _panic(self):
         self.controller.panic()
         self.comms.send_panic()
+        self.bus.publish("sequence", t=self.t_count, event="panic")
     # Sequenced activation - Adding, removing steps and start sequence
     def _seq_send(self):
         # Validate and build payload via controller
@@ -471,14 +622,19 @@ class FlowBench(QMainWindow):
         self._send_worker.failed.connect(self._on_send_failed)
         self._send_worker.start()
 
-    def _on_send_success(self):
+    def _on_send_success(self, mode):
         self.btn_run.setEnabled(True)
         self.btn_send.setEnabled(True)
         self.btn_send.setStyleSheet("color: #7fff6b; border-color: #7fff6b; background: #7fff6b12;")
-        self._on_seq_status_changed(
-            f"Sent {self.controller.sent_sequence['step_count']} step(s) to ESP32.\nPress RUN when ready.",
-            "#7fff6b"
-        )
+        count = self.controller.sent_sequence['step_count']
+        if mode == "unchanged":
+            msg = f"ESP32 already has this sequence ({count} step(s)).\nPress RUN when ready."
+        elif mode == "delta":
+            msg = f"Updated changed steps on ESP32 ({count} step(s)).\nPress RUN when ready."
+        else:
+            msg = f"Sent {count} step(s) to ESP32.\nPress RUN when ready."
+        self._on_seq_status_changed(msg, "#7fff6b")
+        self.bus.publish("sequence", t=self.t_count, event="sent", hash=self.controller.sent_sequence["hash"], step_count=count)
 
     def _on_send_failed(self, reason: str):
         self.controller._reset_send_state()
@@ -489,13 +645,33 @@ class FlowBench(QMainWindow):
         self.controller._reset_send_state()
         self.btn_run.setEnabled(False)
         self.btn_send.setStyleSheet("")
+    def _on_step_changed(self, step_widget):
+        self.controller.invalidate_step(step_widget)
+        self.btn_run.setEnabled(False)
+        self.btn_send.setStyleSheet("")
+        self._validate_sequence()
+    def _validate_sequence(self):
+        if not self.seq_steps:
+            self.validation_lbl.setText("")
+            return
+        report = self.controller.validate()
+        issues = report.errors or report.warnings
+        color = "#ff3333" if report.errors else "#ffcc00" if report.warnings else "#888"
+        text = report.summary()
+        if issues:
+            text += "\n" + issues[0] + (f" (+{len(issues) - 1} more)" if len(issues) > 1 else "")
+        self.validation_lbl.setText(text)
+        self.validation_lbl.setStyleSheet(f"color: {color};")
+        self.validation_lbl.setToolTip("\n".join(report.errors + report.warnings))
     def _add_step(self):
         step_num = len(self.seq_steps) + 1
         step = SequenceStep(step_num, self.controller)
         step.removed.connect(self._remove_step)
+        step.changed.connect(self._on_step_changed)
         self.seq_layout.insertWidget(self.seq_layout.count() - 1, step)
         self.seq_steps.append(step)
         self.controller.set_steps(self.seq_steps)
+        self._validate_sequence()
     def _remove_step(self, step_widget):
         if step_widget in self.seq_steps:
             self.seq_steps.remove(step_widget)
@@ -504,11 +680,21 @@ class FlowBench(QMainWindow):
             for i, s in enumerate(self.seq_steps):
                 s.num_lbl.setText(f"STEP {i+1:02d}")
             self.controller.set_steps(self.seq_steps)
+            self._validate_sequence()
     def _seq_start(self):
         if self.controller.run_sequence():
-            self.comms.run_sequence()
+            if not self.comms.run_sequence():
+                # Nothing is running on the ESP32, so no completion event will re-enable the buttons
+                self.controller._seq_stop()
+                self.btn_run.setEnabled(True)
+                self.btn_send.setEnabled(True)
+                reason = f"link {self.comms.link.state}" if not self.comms.link.allow() else "no confirmation from ESP32"
+                self._on_seq_status_changed(f"RUN failed ({reason}) — sequence not started.", "#ff3333")
+                return
             self.btn_run.setEnabled(False)
             self.btn_send.setEnabled(False)
+            self._start_deviation()
+            self.bus.publish("sequence", t=self.t_count, event="run", hash=self.controller.sent_sequence["hash"])
     # Recording and logging logic
     def _toggle_record(self, checked):
         if checked:
@@ -534,21 +720,183 @@ class FlowBench(QMainWindow):
             step.num_lbl.setStyleSheet(f"color: {step_lbl_color}; letter-spacing: 2px;")
             for cb, _ in step.valve_actions:
                 cb.text_lbl.setStyleSheet(f"color: {cb.color};" if self.dark_mode else f"color: #000;")
+    def _update_link_state(self):
+        if not isinstance(self.source, LiveSource):
+            state = "REPLAY"
+        else:
+            state = "STREAM" if self.source.streaming else self.comms.link.state
+        if state == self._link_state:
+            return
+        self._link_state = state
+        color = {"UP": "#7fff6b", "STREAM": "#7fff6b", "PROBING": "#ffcc00", "DOWN": "#ff3333"}.get(state, "#888")
+        self.link_lbl.setText(f"● LINK {state}" if state != "REPLAY" else "● REPLAY")
+        self.link_lbl.setStyleSheet(f"color: {color};")
     # Called every Update Rate to update the graphs
     def _update(self):
-        values = self.comms.read_pressures()
-        if values is None or len(values) != len(CHANNELS):
+        self._update_link_state()
+        # A tick can bring several samples (e.g. accelerated replay) - ingest them all, then redraw once
+        values = None
+        for kind, data in self.source.poll():
+            if kind == "valves":
+                self._apply_replayed_valves(data)
+                continue
+            if kind == "sequence":
+                self._on_sequence_event(data)
+                continue
+            if len(data) != len(CHANNELS):
+                continue
+            values = data
+            self.t_count += UPDATE_RATE_MS / 1000.0
+            for i, val in enumerate(values):
+                self.buffers[i].append(val)
+                self.channel_stats[i].add(self.t_count, val)
+            self.live_index.append_sample(self.t_count, values)
+            self.deviation.add(self.t_count, values)
+            self.bus.publish("sample", t=self.t_count, values=values)
+            # Write pressures to csv file if recording
+            self.logger.log_pressures(values)
+        if values is None:
+            if self.source.finished and self.data_timer.isActive():
+                self.data_timer.stop()
+                self._on_seq_status_changed(f"{self.source.name} finished.", "#888")
             return
-        self.t_count += UPDATE_RATE_MS / 1000.0
         x = [self.t_count - MAX_POINTS * UPDATE_RATE_MS / 1000.0 + j * UPDATE_RATE_MS / 1000.0
             for j in range(MAX_POINTS)]
         for i, val in enumerate(values):
-            self.buffers[i].append(val)
             self.val_labels[i].setText(f"{val:.2f} bar")
             self.curves[i].setData(x, list(self.buffers[i]))
             self.combined_curves[i].setData(x, list(self.buffers[i]))
-        # Write pressures to csv file if recording
-        self.logger.log_pressures(values)
+        self._update_event_markers(x[0], x[-1])
+        self._update_expected_overlay(x[0], x[-1])
+        self._trim_live_index(x[0])
+        self._update_stats()
+    def _update_stats(self):
+        # Stats are kept up to date every sample, labels and the log only at a lower rate
+        if STATS_LOG_PERIOD_S and self.logger.recording and self.t_count - self._stats_logged_at >= STATS_LOG_PERIOD_S:
+            self._stats_logged_at = self.t_count
+            self.logger.log_stats([v for s in self.channel_stats for v in s.row()])
+        self._stats_tick += 1
+        if self._stats_tick < STATS_UPDATE_TICKS:
+            return
+        self._stats_tick = 0
+        for stats, lbl in zip(self.channel_stats, self.stats_labels):
+            lines = []
+            for w in stats.windows:
+                lines.append(f"{w.window_s:>3g}s μ {w.mean:7.2f}")
+                lines.append(f"    σ {w.std:6.3f}")
+                lines.append(f"    ▼{w.min:6.2f} ▲{w.max:6.2f}")
+                lines.append(f"    Δ {w.slope:+6.2f}/s")
+            lbl.setText("\n".join(lines))
+    def _update_event_markers(self, t0, t1):
+        # Binary search for the events inside the visible window - only new ones get a line added
+        lo, hi = self.live_index.events_between(t0, t1)
+        plots = self.plots + [self.combined_plot]
+        for i in [i for i in self.event_markers if i < lo]:
+            for plot, line in zip(plots, self.event_markers.pop(i)):
+                plot.removeItem(line)
+        for i in range(lo, hi):
+            if i in self.event_markers:
+                continue
+            valve = int(self.live_index.event_valves[i])
+            style = Qt.PenStyle.SolidLine if self.live_index.event_open[i] else Qt.PenStyle.DashLine
+            pen = pg.mkPen(color=VALVE_COLORS[valve], width=1, style=style)
+            lines = []
+            for plot in plots:
+                line = pg.InfiniteLine(pos=float(self.live_index.event_times[i]), angle=90, pen=pen)
+                plot.addItem(line)
+                lines.append(line)
+            self.event_markers[i] = lines
+    def _trim_live_index(self, t0):
+        # Only the visible window is needed - trimmed in batches so each sample doesn't pay for a copy
+        if self.live_index.n < LIVE_INDEX_TRIM_AT:
+            return
+        dropped = self.live_index.trim_before(t0)
+        if dropped:
+            # Markers of dropped events were removed by _update_event_markers - renumber the rest
+            self.event_markers = {i - dropped: lines for i, lines in self.event_markers.items() if i >= dropped}
+    def _start_deviation(self):
+        # Fresh tracker and overlay per run - the timeline itself is cached by the controller
+        plots = self.plots + [self.combined_plot]
+        for lines in self.expected_markers.values():
+            for plot, line in zip(plots, lines):
+                plot.removeItem(line)
+        self.expected_markers = {}
+        self._responses_drawn = 0
+        self._deviation_shown = None
+        self.response_points.clear()
+        self.expected_servo.setData([], [])
+        timeline = self.controller.expected_timeline()
+        self.deviation.start(timeline)
+        self.combined_plot.getPlotItem().showAxis("right", len(timeline.servo_t) > 1)
+        self.deviation_lbl.setText("")
+    def _update_expected_overlay(self, t0, t1):
+        dev = self.deviation
+        if not dev.started:
+            return
+        tl = dev.timeline
+        # Expected transitions as dotted lines once the graph reaches them, same bookkeeping as the event markers
+        lo = int(np.searchsorted(tl.trans_t, t0 - dev.t0, side="left"))
+        hi = int(np.searchsorted(tl.trans_t, t1 - dev.t0, side="right"))
+        plots = self.plots + [self.combined_plot]
+        for i in [i for i in self.expected_markers if i < lo]:
+            for plot, line in zip(plots, self.expected_markers.pop(i)):
+                plot.removeItem(line)
+        for i in range(lo, hi):
+            if i in self.expected_markers:
+                continue
+            pen = pg.mkPen(color=VALVE_COLORS[int(tl.trans_valve[i])], width=1, style=Qt.PenStyle.DotLine)
+            lines = []
+            for plot in plots:
+                line = pg.InfiniteLine(pos=dev.t0 + float(tl.trans_t[i]), angle=90, pen=pen)
+                plot.addItem(line)
+                lines.append(line)
+            self.expected_markers[i] = lines
+        # Expected servo position up to now, drawn as steps
+        n = int(np.searchsorted(tl.servo_t, t1 - dev.t0, side="right"))
+        if n > 1:
+            ts = np.append(tl.servo_t[1:n], t1 - dev.t0) + dev.t0
+            self.expected_servo.setData(np.repeat(ts, 2)[1:-1], np.repeat(tl.servo_pos[1:n], 2))
+        # Observed responses as crosses on the combined graph
+        for te, t, ch in dev.responses[self._responses_drawn:]:
+            if ch >= 0:
+                i = min(int(np.searchsorted(self.live_index.times, t)), self.live_index.n - 1)
+                value = self.live_index.values[i, ch]
+                self.response_points.addPoints([{"pos": (t, value), "pen": pg.mkPen(CHANNELS[ch]["color"], width=2)}])
+        shown = (len(dev.step_errors), dev.steps_skipped, len(dev.responses))
+        if shown != self._deviation_shown:
+            self._deviation_shown = shown
+            self._show_deviation()
+        self._responses_drawn = len(dev.responses)
+    def _show_deviation(self):
+        dev = self.deviation
+        lines = [f"Step timing: max {dev.max_step_error_s * 1000:.0f} ms off expected ({len(dev.step_errors)} steps"
+                 + (f", {dev.steps_skipped} skipped)" if dev.steps_skipped else ")")]
+        if dev.responses:
+            lines.append(f"Response lag: mean {dev.mean_lag_s * 1000:.0f} ms, max {dev.max_lag_s * 1000:.0f} ms "
+                         f"({dev.n_responded}/{len(dev.responses)} seen)")
+        self.deviation_lbl.setText("\n".join(lines))
+    # Profiling capture
+    def _toggle_profile(self):
+        if self.profiler.active:
+            self._profile_stop()
+        else:
+            self._profile_start(PROFILE_DURATION_S)
+    def _profile_start(self, seconds):
+        if self.profiler.start():
+            self.profile_timer.start(int(seconds * 1000))
+            self._on_seq_status_changed(f"Profiling for {seconds:g} s... (F9 to stop)", "#ffcc00")
+    def _profile_stop(self):
+        self.profile_timer.stop()
+        paths = self.profiler.stop()
+        if paths:
+            self._on_seq_status_changed(f"Profile saved:\n{os.path.basename(paths[0])}", "#7fff6b")
+            print(f"[Profile] Report {paths[0]}\n[Profile] Stacks {paths[1]}")
+    def closeEvent(self, e):
+        if self.profiler.active:
+            self._profile_stop()
+        self.source.stop()
+        self.bus.stop()
+        super().closeEvent(e)
     # Styles
     def _stylesheet(self):
         if self.dark_mode:
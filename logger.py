@@ -2,45 +2,165 @@ import csv
 import os
 import time
 from datetime import datetime
+from recording import MANIFEST_VERSION, RECORDING_PREFIX, chunk_names, fsync_dir, write_manifest
+from timeindex import VALVE_LOG_EXTRA, RecordingIndex, index_path
+
+PRESSURE_COLUMNS = ["P1_Pressurant_bar", "P2_OxidiserTank_bar", "P3_Injector_bar", "P4_Name_bar"]
+VALVE_COLUMNS = ["Solenoid_Valve_1", "Solenoid_Valve_2", "Servo_Valve_1"]
+LOG_DIR = os.path.dirname(os.path.abspath(__file__))
+CHUNK_MAX_BYTES = 8 * 1024 * 1024   # A chunk is sealed once its pressure log reaches this size...
+CHUNK_MAX_S = 600                   # ...or covers this many seconds, whichever comes first
+FLUSH_PERIOD_S = 1.0                # Open chunk handed to the OS this often (fsync only on seal)
+
 
 class Logger:
+    # Each recording goes to LOG_DIR/recording_<ts>/ as a series of chunks (see recording.py).
+    # Files stay open while a chunk is being written and only the open chunk's index is held in
+    # memory, so per-write cost and memory stay flat however long the recording runs.
     def __init__(self):
         self.recording = False
         self.record_start_time = None
+        self.folder = None
+        self.manifest = None
         self.pressure_log_path = None
         self.valve_log_path = None
+        self.index = None   # RecordingIndex of the open chunk, saved when it is sealed
+        self.stats_columns = None   # Set by the GUI to log rolling statistics to stats_NNNN.csv
+        self.stats_log_path = None
+        self._files = {}
+        self._writers = {}
+        self._chunk = None
+        self._chunk_bytes = 0
+        self._chunk_t0 = 0.0
+        self._flushed_at = 0.0
+        self._valve_states = [False] * len(VALVE_COLUMNS)
 
     def start(self):
         self.recording = True
         self.record_start_time = time.perf_counter()
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        log_dir = os.path.dirname(os.path.abspath(__file__))
-        self.pressure_log_path = os.path.join(log_dir, f"pressure_{ts}.csv")
-        self.valve_log_path = os.path.join(log_dir, f"valves_{ts}.csv")
-        with open(self.pressure_log_path, 'w', newline='') as f:
-            csv.writer(f).writerow(["time_elapsed", "P1_Pressurant_bar", "P2_OxidiserTank_bar", "P3_Injector_bar", "P4_Name_bar"])
-        with open(self.valve_log_path, 'w', newline='') as f:
-            csv.writer(f).writerow(["time_elapsed", "Solenoid_Valve_1", "Solenoid_Valve_2", "Servo_Valve_1"])
+        self.folder = os.path.join(LOG_DIR, RECORDING_PREFIX + ts)
+        os.makedirs(self.folder, exist_ok=True)
+        self.manifest = {
+            "version": MANIFEST_VERSION,
+            "started": datetime.now().isoformat(timespec="seconds"),
+            "channels": PRESSURE_COLUMNS,
+            "valves": VALVE_COLUMNS,
+            "chunks": [],
+            "complete": False,
+        }
+        self._open_chunk(0.0)
 
     def stop(self):
+        if not self.recording:
+            return
+        self._seal_chunk()
+        self.manifest["complete"] = True
+        self._write_manifest()
         self.recording = False
         self.record_start_time = None
 
+    def _elapsed(self) -> float:
+        return round(time.perf_counter() - self.record_start_time, 4)
+
+    def _write_manifest(self):
+        try:
+            write_manifest(self.folder, self.manifest)
+        except OSError as e:
+            print(f"[Logger] ERROR: Could not write manifest: {e}")
+
+    def _open_chunk(self, elapsed: float):
+        n = len(self.manifest["chunks"])
+        names = chunk_names(n)
+        self.pressure_log_path = os.path.join(self.folder, names["pressure"])
+        self.valve_log_path = os.path.join(self.folder, names["valves"])
+        self.stats_log_path = os.path.join(self.folder, names["stats"]) if self.stats_columns else None
+        headers = {
+            "pressure": ["time_elapsed"] + PRESSURE_COLUMNS,
+            "valves": ["time_elapsed"] + VALVE_COLUMNS + list(VALVE_LOG_EXTRA),
+            "stats": ["time_elapsed"] + (self.stats_columns or []),
+        }
+        self._files, self._writers = {}, {}
+        for key, path in (("pressure", self.pressure_log_path), ("valves", self.valve_log_path),
+                          ("stats", self.stats_log_path)):
+            if path is None:
+                continue
+            f = open(path, "w", newline="")
+            self._files[key] = f
+            self._writers[key] = csv.writer(f)
+            self._writers[key].writerow(headers[key])
+        fsync_dir(self.folder)
+        self.index = RecordingIndex(PRESSURE_COLUMNS, VALVE_COLUMNS)
+        self._chunk = {"index": n, **names, "t_start": None, "t_end": None, "samples": 0,
+                       "events": 0, "bytes": 0, "sealed": False}
+        if not self.stats_columns:
+            del self._chunk["stats"]
+        self.manifest["chunks"].append(self._chunk)
+        self._write_manifest()
+        self._chunk_bytes = 0
+        self._chunk_t0 = elapsed
+        self._flushed_at = elapsed
+        # Every chunk starts with the full valve state so it can be read on its own
+        self._write_valve_row(elapsed, self._valve_states, "chunk", "")
+
+    def _seal_chunk(self):
+        # Flush, fsync and close the chunk, then save its index and record it in the manifest
+        for f in self._files.values():
+            try:
+                f.flush()
+                os.fsync(f.fileno())
+                f.close()
+            except OSError as e:
+                print(f"[Logger] ERROR: Could not seal {os.path.basename(f.name)}: {e}")
+        self._files, self._writers = {}, {}
+        # Saved after the last CSV write so RecordingIndex.open treats it as up to date
+        try:
+            self.index.save(index_path(self.pressure_log_path))
+        except OSError as e:
+            print(f"[Logger] ERROR: Could not save index: {e}")
+        self._chunk["bytes"] = os.path.getsize(self.pressure_log_path)
+        self._chunk["sealed"] = True
+        self._write_manifest()
+
+    def _after_write(self, elapsed: float):
+        if self._chunk_bytes >= CHUNK_MAX_BYTES or elapsed - self._chunk_t0 >= CHUNK_MAX_S:
+            self._seal_chunk()
+            self._open_chunk(elapsed)
+        elif elapsed - self._flushed_at >= FLUSH_PERIOD_S:
+            self._flushed_at = elapsed
+            for f in self._files.values():
+                f.flush()
+
     def log_pressures(self, values):
-        if not self.recording or not self.pressure_log_path:
+        if not self.recording:
             return
-        elapsed = round(time.perf_counter() - self.record_start_time, 4)
-        with open(self.pressure_log_path, 'a', newline='') as f:
-            csv.writer(f).writerow([elapsed] + [f"{v:.4f}" for v in values])
+        elapsed = self._elapsed()
+        line = f"{elapsed}," + ",".join(f"{v:.4f}" for v in values) + "\r\n"   # Same row csv.writer would write
+        self._files["pressure"].write(line)
+        self._chunk_bytes += len(line)
+        self.index.append_sample(elapsed, values)
+        if self._chunk["t_start"] is None:
+            self._chunk["t_start"] = elapsed
+        self._chunk["t_end"] = elapsed
+        self._chunk["samples"] += 1
+        self._after_write(elapsed)
+
+    def log_valve_state(self, valve_states, event="", device_t_ms=""):
+        # event/device_t_ms are filled for rows caused by sequence progress reported by the ESP32
+        self._valve_states = list(valve_states)
+        if not self.recording:
+            return
+        elapsed = self._elapsed()
+        self._write_valve_row(elapsed, valve_states, event, device_t_ms)
+        self._after_write(elapsed)
+
+    def _write_valve_row(self, elapsed, valve_states, event, device_t_ms):
+        self._writers["valves"].writerow([elapsed] + ["OPEN" if s else "CLOSED" for s in valve_states]
+                                         + [event, device_t_ms])
+        self.index.append_valve_states(elapsed, valve_states)
+        self._chunk["events"] += 1
 
-    def log_valve_state(self, valve_states):
-        if not self.recording or not self.valve_log_path:
+    def log_stats(self, values):
+        if not self.recording or "stats" not in self._writers:
             return
-        elapsed = round(time.perf_counter() - self.record_start_time, 4)
-        with open(self.valve_log_path, 'a', newline='') as f:
-            csv.writer(f).writerow([
-                elapsed,
-                "OPEN" if valve_states[0] else "CLOSED",
-                "OPEN" if valve_states[1] else "CLOSED",
-                "OPEN" if valve_states[2] else "CLOSED",
-            ])
\ No newline at end of file
+        self._writers["stats"].writerow([self._elapsed()] + [f"{v:.4f}" for v in values])
@@ -1,10 +1,21 @@
+import argparse
 import sys
 from PyQt6.QtWidgets import QApplication
 from gui import FlowBench
+from sources import ReplaySource
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="FlowBench ground support GUI")
+    parser.add_argument("--replay", metavar="RECORDING", help="Replay a recording_<ts> folder (or an older pressure_<ts>.csv) instead of polling the ESP32")
+    parser.add_argument("--speed", default="1", help="Replay speed: 1, 10, ... or 'max' (default 1)")
+    parser.add_argument("--profile", type=float, metavar="SECONDS", help="Capture a profile from startup (F9 at any time)")
+    args, qt_args = parser.parse_known_args()
+
+    app = QApplication(sys.argv[:1] + qt_args)
     app.setApplicationName("FlowBench")
-    window = FlowBench()
+    source = None
+    if args.replay:
+        source = ReplaySource(args.replay, speed=None if args.speed == "max" else float(args.speed))
+    window = FlowBench(source, profile_s=args.profile)
     window.show()
     sys.exit(app.exec())
\ No newline at end of file
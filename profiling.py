@@ -0,0 +1,118 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+# On-demand profiling of the running app. A background thread samples the Python stack of
+# every thread (GUI, QThread workers, bus/stream threads) with sys._current_frames(), and
+# tracemalloc records allocations, for a fixed time. Nothing runs between captures.
+#
+# Output, next to the logs:
+#   profile_<ts>.txt     - report: hottest functions (self and total), threads, top allocations
+#   profile_<ts>.folded  - collapsed stacks for flamegraph.pl / speedscope / inferno
+
+SAMPLE_INTERVAL_S = 0.005
+TRACEMALLOC_FRAMES = 10
+REPORT_TOP = 25
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class ProfileCapture:
+    def __init__(self, out_dir: str):
+        self.out_dir = out_dir
+        self.active = False
+        self._stop = threading.Event()
+        self._thread = None
+        self._stacks = Counter()
+        self._threads = Counter()
+        self._samples = 0
+        self._started = None
+        self._alloc_start = None
+        self._own_tracemalloc = False
+
+    def start(self) -> bool:
+        if self.active:
+            return False
+        self.active = True
+        self._stop.clear()
+        self._stacks.clear()
+        self._threads.clear()
+        self._samples = 0
+        self._started = time.perf_counter()
+        self._own_tracemalloc = not tracemalloc.is_tracing()
+        if self._own_tracemalloc:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        self._alloc_start = tracemalloc.take_snapshot()
+        self._thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self) -> tuple[str, str] | None:
+        # Ends the capture and writes the report - returns (report path, folded stacks path)
+        if not self.active:
+            return None
+        self._stop.set()
+        self._thread.join()
+        elapsed = time.perf_counter() - self._started
+        alloc_end = tracemalloc.take_snapshot()
+        if self._own_tracemalloc:
+            tracemalloc.stop()
+        self.active = False
+
+        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+        report_path = os.path.join(self.out_dir, f"profile_{ts}.txt")
+        folded_path = os.path.join(self.out_dir, f"profile_{ts}.folded")
+        with open(folded_path, "w") as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{';'.join(stack)} {count}\n")
+        with open(report_path, "w") as f:
+            f.write(self._report(elapsed, alloc_end))
+        return report_path, folded_path
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while not self._stop.wait(SAMPLE_INTERVAL_S):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                thread = names.get(ident, f"thread-{ident}")
+                self._stacks[(thread, *reversed(stack))] += 1
+                self._threads[thread] += 1
+            self._samples += 1
+
+    def _report(self, elapsed: float, alloc_end) -> str:
+        inclusive = Counter()
+        leaf = Counter()
+        for stack, count in self._stacks.items():
+            leaf[stack[-1]] += count
+            for label in set(stack[1:]):
+                inclusive[label] += count
+        total = max(sum(self._stacks.values()), 1)
+
+        lines = [
+            f"FlowBench profile - {datetime.now():%Y-%m-%d %H:%M:%S}",
+            f"Duration {elapsed:.2f} s, {self._samples} sampling passes every {SAMPLE_INTERVAL_S * 1000:.0f} ms",
+            "",
+            "Samples per thread:",
+        ]
+        lines += [f"  {count:7d}  {name}" for name, count in self._threads.most_common()]
+        lines += ["", f"Top {REPORT_TOP} by self samples (where time is actually spent):"]
+        lines += [f"  {count:7d} {100 * count / total:5.1f}%  {label}" for label, count in leaf.most_common(REPORT_TOP)]
+        lines += ["", f"Top {REPORT_TOP} by total samples (including callees):"]
+        lines += [f"  {count:7d} {100 * count / total:5.1f}%  {label}" for label, count in inclusive.most_common(REPORT_TOP)]
+        lines += ["", f"Top {REPORT_TOP} allocation growth during capture:"]
+        for stat in alloc_end.compare_to(self._alloc_start, "lineno")[:REPORT_TOP]:
+            lines.append(f"  {stat}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,243 @@
+import argparse
+import json
+import os
+import sys
+import numpy as np
+from timeindex import VALVE_LOG_EXTRA, RecordingIndex
+
+# Chunked recordings. Logger writes each recording into its own folder as a series of chunks,
+# each a self-contained pressure/valve/stats CSV set, plus a small manifest of what is in them:
+#
+#   recording_<ts>/
+#       manifest.json
+#       pressure_0000.csv  valves_0000.csv  stats_0000.csv  index_0000.npz
+#       pressure_0001.csv  ...
+#
+# A chunk is sealed (flushed, fsynced and closed) when it reaches CHUNK_MAX_BYTES or
+# CHUNK_MAX_S, so a crash can only cost the tail of the open chunk. The manifest is always
+# replaced atomically. After a crash, `python recording.py --recover recording_<ts>` cuts
+# partial rows off the chunks and rebuilds the manifest from what is on disk.
+#
+# Readers look chunks up by time in the manifest and only open the ones they need.
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+RECORDING_PREFIX = "recording_"
+TAIL_READ_BYTES = 4096   # Enough to hold the last complete row of a chunk
+
+
+def chunk_names(n: int) -> dict[str, str]:
+    return {"pressure": f"pressure_{n:04d}.csv", "valves": f"valves_{n:04d}.csv", "stats": f"stats_{n:04d}.csv"}
+
+
+def fsync_dir(folder: str):
+    # Makes renames/creates in folder durable - not possible (or needed) on Windows
+    if os.name == "nt":
+        return
+    fd = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_manifest(folder: str, manifest: dict):
+    # Write-then-rename so a crash leaves either the old or the new manifest, never half of one
+    path = os.path.join(folder, MANIFEST_NAME)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    fsync_dir(folder)
+
+
+def read_manifest(folder: str) -> dict:
+    with open(os.path.join(folder, MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def is_recording(path: str) -> bool:
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, MANIFEST_NAME))
+
+
+class ChunkedRecording:
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.manifest = read_manifest(folder)
+        self.channels = self.manifest["channels"]
+        self.valves = self.manifest["valves"]
+        # Only chunks holding samples can be looked up by time
+        self.chunks = [c for c in self.manifest["chunks"] if c.get("samples") and c.get("t_start") is not None]
+        self.t_start = np.array([c["t_start"] for c in self.chunks])
+        self.t_end = np.array([c["t_end"] for c in self.chunks])
+
+    @property
+    def duration(self) -> float:
+        return float(self.t_end[-1]) if len(self.chunks) else 0.0
+
+    def paths(self, chunk: dict) -> tuple[str, str]:
+        return os.path.join(self.folder, chunk["pressure"]), os.path.join(self.folder, chunk["valves"])
+
+    def chunks_between(self, t0: float, t1: float) -> range:
+        # Chunks overlapping [t0, t1] - both bounds are sorted, so two binary searches
+        lo = int(np.searchsorted(self.t_end, t0, side="left"))
+        hi = int(np.searchsorted(self.t_start, t1, side="right"))
+        return range(lo, max(lo, hi))
+
+    def open_chunk(self, i: int) -> RecordingIndex:
+        return RecordingIndex.open(*self.paths(self.chunks[i]))
+
+    def index_between(self, t0: float, t1: float) -> RecordingIndex:
+        # Index of just the chunks covering the range. Each chunk opens with a row of the full
+        # valve state, so valves already open show up as events at the start of the first one.
+        return RecordingIndex.concat([self.open_chunk(i) for i in self.chunks_between(t0, t1)],
+                                     self.channels, self.valves)
+
+    def window(self, t0: float, t1: float) -> tuple[np.ndarray, np.ndarray]:
+        return self.index_between(t0, t1).window(t0, t1)
+
+
+def _cut_partial_tail(path: str) -> int:
+    # Drops the tail after the last complete row - a row cut short by a crash, or the zeros
+    # unwritten blocks read back as after a power loss. Scans back from the end a block at a
+    # time and never cuts into the header. Returns bytes removed.
+    size = os.path.getsize(path)
+    with open(path, "rb+") as f:
+        header = f.readline()
+        if not header.endswith(b"\n"):
+            return 0
+        keep = header_end = len(header)
+        candidate = None    # Offset of a newline whose row is being checked
+        nul = False         # That row holds a NUL
+        pos = size
+        while pos > header_end:
+            start = max(header_end, pos - TAIL_READ_BYTES)
+            f.seek(start)
+            block = f.read(pos - start)
+            end = len(block)
+            while True:
+                i = block.rfind(b"\n", 0, end)
+                if candidate is not None:
+                    nul = nul or b"\0" in block[i + 1:end]
+                    if i >= 0 and not nul:
+                        keep = candidate + 1
+                        break
+                if i < 0:
+                    break
+                candidate, nul, end = start + i, False, i
+            if keep > header_end:
+                break
+            pos = start
+        else:
+            if candidate is not None and not nul:
+                keep = candidate + 1   # Only the first row is complete
+        if keep < size:
+            f.truncate(keep)
+            f.flush()
+            os.fsync(f.fileno())
+    return size - keep
+
+
+def _row_time(line: bytes) -> float | None:
+    try:
+        return float(line.split(b",", 1)[0])
+    except ValueError:
+        return None
+
+
+def _first_last_times(path: str) -> tuple[float | None, float | None, int]:
+    # (first time, last time, rows) of a chunk CSV without parsing the values - rows whose
+    # time can't be read (e.g. left by a crash) are skipped
+    first = None
+    rows = 0
+    with open(path, "rb") as f:
+        f.readline()   # Header
+        for line in f:
+            if not line.strip():
+                continue
+            rows += 1
+            if first is None:
+                first = _row_time(line)
+        f.seek(max(0, os.path.getsize(path) - TAIL_READ_BYTES))
+        lines = f.read().splitlines()
+    if first is None:
+        return None, None, 0
+    last = next((t for t in map(_row_time, reversed(lines)) if t is not None), first)
+    return first, last, rows
+
+
+def recover(folder: str) -> dict:
+    """Rebuilds manifest.json from the chunk files after a crash. Partial last rows are cut off,
+    every chunk is re-summarised from its CSVs and synced, and stale indexes are rebuilt."""
+    try:
+        old = read_manifest(folder)
+    except (OSError, ValueError):
+        old = {}
+    chunks = []
+    n = 0
+    while os.path.exists(os.path.join(folder, chunk_names(n)["pressure"])):
+        names = {k: v for k, v in chunk_names(n).items() if os.path.exists(os.path.join(folder, v))}
+        for name in names.values():
+            cut = _cut_partial_tail(os.path.join(folder, name))
+            if cut:
+                print(f"[Recording] Cut {cut} byte(s) of partial row from {name}")
+        pressure_path = os.path.join(folder, names["pressure"])
+        t_start, t_end, samples = _first_last_times(pressure_path)
+        valve_path = os.path.join(folder, chunk_names(n)["valves"])
+        events = _first_last_times(valve_path)[2] if "valves" in names else 0
+        if "valves" not in names:
+            print(f"[Recording] ERROR: {chunk_names(n)['valves']} missing - chunk {n} has pressures only")
+        elif samples:
+            RecordingIndex.open(pressure_path, valve_path)   # Rebuilds the index if the CSVs changed
+        chunks.append({"index": n, **names, "t_start": t_start, "t_end": t_end, "samples": samples,
+                       "events": events, "bytes": os.path.getsize(pressure_path), "sealed": True})
+        n += 1
+
+    channels, valves = old.get("channels"), old.get("valves")
+    if chunks and (channels is None or valves is None):
+        with open(os.path.join(folder, chunks[0]["pressure"])) as f:
+            channels = f.readline().strip().split(",")[1:]
+        with open(os.path.join(folder, chunks[0]["valves"])) as f:
+            valves = [v for v in f.readline().strip().split(",")[1:] if v not in VALVE_LOG_EXTRA]
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "started": old.get("started"),
+        "channels": channels or [],
+        "valves": valves or [],
+        "chunks": chunks,
+        "complete": True,
+        "recovered": True,
+    }
+    write_manifest(folder, manifest)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or recover chunked FlowBench recordings")
+    parser.add_argument("folders", nargs="+", help="recording_<ts> folders")
+    parser.add_argument("--recover", action="store_true", help="Repair chunks and rebuild the manifest after a crash")
+    args = parser.parse_args(argv)
+
+    status = 0
+    for folder in args.folders:
+        try:
+            manifest = recover(folder) if args.recover else read_manifest(folder)
+        except (OSError, ValueError) as e:
+            print(f"[Recording] ERROR: {folder}: {e}")
+            status = 1
+            continue
+        chunks = manifest["chunks"]
+        samples = sum(c.get("samples") or 0 for c in chunks)
+        state = "complete" if manifest.get("complete") else "NOT CLOSED - run with --recover"
+        print(f"[Recording] {folder}: {len(chunks)} chunk(s), {samples} sample(s), {state}")
+        for c in chunks:
+            span = f"{c['t_start']:.2f}-{c['t_end']:.2f} s" if c.get("t_start") is not None else "empty"
+            print(f"  {c['index']:4d}  {span:>22}  {c.get('samples') or 0:8d} samples"
+                  f"  {c.get('events') or 0:5d} valve rows  {'sealed' if c.get('sealed') else 'open'}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
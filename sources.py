@@ -0,0 +1,149 @@
+import os
+import time
+import numpy as np
+from comms import sequence_events
+from recording import ChunkedRecording, is_recording
+from timeindex import RecordingIndex
+
+# Data sources feeding FlowBench._update. poll() is called every UPDATE_RATE_MS and returns the
+# items produced since the last call, in order:
+#   ("sample", [p1, p2, p3, p4])   - one pressure sample
+#   ("valves", [bool, ...])        - full valve state after a change (replay only, live valves come from the UI)
+#   ("sequence", {...})            - sequence step/completion reported by the ESP32 (live only)
+
+REPLAY_MAX_BATCH = 5000   # Samples handed over per tick when replaying as fast as possible
+
+
+class DataSource:
+    name = "none"
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    @property
+    def finished(self) -> bool:
+        return False
+
+    def poll(self) -> list[tuple[str, list]]:
+        return []
+
+
+class LiveSource(DataSource):
+    # Every telemetry frame produced since the last tick - pushed over the TelemetryStream when
+    # it is connected, otherwise polled through Comms
+    name = "ESP32"
+
+    def __init__(self, comms, stream=None):
+        self.comms = comms
+        self.stream = stream
+        self._last_event = None
+
+    @property
+    def streaming(self) -> bool:
+        return self.stream is not None and self.stream.connected
+
+    def start(self):
+        if self.stream:
+            self.stream.start()
+
+    def stop(self):
+        if self.stream:
+            self.stream.stop()
+
+    def poll(self):
+        frames = self.stream.drain() if self.stream else None
+        if frames is not None:
+            # Keep the polling fallback in step so it carries on from the last pushed frame
+            self.comms.last_seq = self.stream.last_seq
+        elif not self.streaming:
+            frames = self.comms.read_telemetry()
+        if frames is None:
+            return []
+        samples = [("sample", v) for v in frames["values"].tolist()]
+        events, self._last_event = sequence_events(frames, self._last_event)
+        # Each event goes just before the first frame that reported it
+        for i, event in reversed(events):
+            samples.insert(i, ("sequence", event))
+        return samples
+
+
+class ReplaySource(DataSource):
+    """Streams a recorded run through the normal pipeline. path is a recording_<ts> folder or an
+    older single pressure_<ts>.csv. speed is a multiple of real time (1.0, 10.0, ...) or None to
+    hand over up to REPLAY_MAX_BATCH samples every tick. Chunks are loaded one at a time."""
+
+    def __init__(self, path: str, valve_path: str | None = None, speed: float | None = 1.0):
+        path = path.rstrip("/\\")
+        if is_recording(path):
+            rec = ChunkedRecording(path)
+            self._chunks = [rec.paths(c) for c in rec.chunks]
+        else:
+            if valve_path is None:
+                folder, name = os.path.split(path)
+                valve_path = os.path.join(folder, "valves_" + name[len("pressure_"):])
+            self._chunks = [(path, valve_path)]
+        self.name = f"Replay {os.path.basename(path)}"
+        self.speed = speed
+        self._t0 = None
+        self._chunk = None
+        self._load_chunk(0)
+        self._t_first = self.index.times[0] if self.index.n else 0.0
+
+    def _load_chunk(self, i: int):
+        if i != self._chunk:
+            self.index = RecordingIndex.open(*self._chunks[i]) if self._chunks else RecordingIndex([], [])
+            self._chunk = i
+        self._pos = 0
+        self._epos = 0
+
+    def start(self):
+        self._t0 = time.perf_counter()
+        self._load_chunk(0)
+        self._states = [False] * len(self.index.valves)
+
+    @property
+    def finished(self) -> bool:
+        return (self._chunk >= len(self._chunks) - 1
+                and self._pos >= self.index.n and self._epos >= self.index.n_events)
+
+    def poll(self):
+        if self._t0 is None:
+            self.start()
+        items = self._poll_chunk()
+        # Carry on into the next chunk once this one has been handed over
+        while (self._pos >= self.index.n and self._epos >= self.index.n_events
+               and self._chunk < len(self._chunks) - 1
+               and (self.speed is not None or len(items) < REPLAY_MAX_BATCH)):
+            self._load_chunk(self._chunk + 1)
+            items += self._poll_chunk()
+        return items
+
+    def _poll_chunk(self):
+        idx = self.index
+        if self._pos >= idx.n and self._epos >= idx.n_events:
+            return []
+        if self.speed is None:
+            hi = min(self._pos + REPLAY_MAX_BATCH, idx.n)
+            ehi = self._epos + int(np.searchsorted(idx.event_positions[self._epos:], hi, side="right"))
+        else:
+            t_now = self._t_first + (time.perf_counter() - self._t0) * self.speed
+            hi = int(np.searchsorted(idx.times, t_now, side="right"))
+            ehi = int(np.searchsorted(idx.event_times, t_now, side="right"))
+        if hi == idx.n:
+            ehi = idx.n_events
+        # Interleave events with samples - event i happened just before sample event_positions[i]
+        items = []
+        pos = self._pos
+        for e in range(self._epos, ehi):
+            at = max(pos, min(int(idx.event_positions[e]), hi))
+            items.extend(("sample", v) for v in idx.values[pos:at].tolist())
+            pos = at
+            self._states[int(idx.event_valves[e])] = bool(idx.event_open[e])
+            items.append(("valves", list(self._states)))
+        items.extend(("sample", v) for v in idx.values[pos:hi].tolist())
+        self._pos = max(hi, pos)
+        self._epos = ehi
+        return items
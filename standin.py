@@ -0,0 +1,314 @@
+import json
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Local stand-in for the ESP32 firmware so the host side can be run without the bench.
+# Mirrors the HTTP endpoints in firmware/main/Wifi.cpp and the push stream in stream.cpp. Run with:
+#   python standin.py 8080 8081
+#   FLOWBENCH_URL=http://127.0.0.1:8080 FLOWBENCH_STREAM_PORT=8081 python main.py
+
+MAX_STEPS = 32
+BASES  = [50.0, 60.5, 20.2, 12.0]
+NOISES = [4.3, 7.2, 2.15, 1.8]
+SAMPLE_PERIOD_S = 0.05
+# Rough plumbing so valve actions show up in the pressures: pressure change per channel while
+# a valve is open, reached with a first-order lag
+VALVE_EFFECTS = {
+    "Solenoid Valve 1": [0.0, 25.0, 12.0, 0.0],
+    "Solenoid Valve 2": [0.0, -15.0, 20.0, 10.0],
+    "Servo Valve 1":    [0.0, 0.0, 15.0, 12.0],
+}
+RESPONSE_TAU_S = 0.15
+TELEMETRY_RING_LEN = 64
+TELEMETRY_HEADER = struct.pack("<HBB", 0x4246, 2, len(BASES))   # Same layout as pressures.h
+FRAME_FORMAT = struct.Struct("<IIhBBI" + "f" * len(BASES))
+SEQ_IDLE, SEQ_RUNNING, SEQ_COMPLETE, SEQ_ABORTED = range(4)
+
+
+class StandInState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sequence = []
+        self.loaded = False
+        self.hash = ""
+        self.step_hashes = []
+        self.running = False
+        self.abort_requested = False
+        self.valves = {}
+        self.latest = list(BASES)
+        self.levels = list(BASES)   # Noise-free pressures following the valves
+        self.ring = deque(maxlen=TELEMETRY_RING_LEN)   # (seq, packed frame)
+        self.next_seq = 0
+        self.boot = time.perf_counter()
+        self.new_sample = threading.Condition(self.lock)
+        self.status = (-1, SEQ_IDLE, 0, 0)   # SequenceStatus: step, state, event_no, event_t_ms
+
+    def sample(self):
+        # Same RNG placeholder as pressures.cpp, around levels that follow the open valves
+        targets = list(BASES)
+        for valve, is_open in list(self.valves.items()):
+            if is_open and valve in VALVE_EFFECTS:
+                targets = [t + e for t, e in zip(targets, VALVE_EFFECTS[valve])]
+        k = SAMPLE_PERIOD_S / (RESPONSE_TAU_S + SAMPLE_PERIOD_S)
+        self.levels = [l + k * (t - l) for l, t in zip(self.levels, targets)]
+        values = [l + n * random.uniform(-1.0, 1.0) for l, n in zip(self.levels, NOISES)]
+        t_ms = self._t_ms()
+        with self.lock:
+            self.latest = values
+            self.ring.append((self.next_seq, FRAME_FORMAT.pack(self.next_seq, t_ms, *self.status, *values)))
+            self.next_seq += 1
+            self.new_sample.notify_all()
+
+    def _t_ms(self) -> int:
+        return int((time.perf_counter() - self.boot) * 1000) & 0xFFFFFFFF
+
+    def _set_status(self, step: int, state: int):
+        with self.lock:
+            self.status = (step, state, (self.status[2] + 1) & 0xFF, self._t_ms())
+
+    def frames(self, since: int | None) -> bytes:
+        with self.lock:
+            if since is None:
+                frames = [f for _, f in list(self.ring)[-1:]]
+            elif since >= self.next_seq:
+                # Same as pressures_get_frames - the host is counting from before a reboot
+                frames = [f for _, f in self.ring]
+            else:
+                frames = [f for seq, f in self.ring if seq > since]
+        return TELEMETRY_HEADER + b"".join(frames)
+
+    def reboot(self):
+        # ESP32 restart as far as telemetry is concerned - seq, ring and clock start again
+        with self.lock:
+            self.ring.clear()
+            self.next_seq = 0
+            self.boot = time.perf_counter()
+            self.status = (-1, SEQ_IDLE, 0, 0)
+
+    def load(self, body: dict) -> bool:
+        with self.lock:
+            if self.running:
+                return False
+            if isinstance(body.get("patch"), list):
+                count = body.get("step_count")
+                if not self.loaded or body.get("base") != self.hash:
+                    return False
+                if not isinstance(count, int) or not 1 <= count <= MAX_STEPS:
+                    return False
+                steps = (self.sequence + [None] * count)[:count]
+                for entry in body["patch"]:
+                    index = entry.get("index")
+                    if not isinstance(index, int) or not 0 <= index < count:
+                        self.loaded, self.hash = False, ""
+                        return False
+                    steps[index] = entry.get("step")
+                self.sequence = steps
+            elif isinstance(body.get("sequence"), list):
+                self.sequence = body["sequence"][:MAX_STEPS]
+            else:
+                return False
+            self.hash = body.get("hash", "") or ""
+            self.step_hashes = list(body.get("step_hashes", []))[:len(self.sequence)]
+            self.loaded = True
+            return True
+
+    def run(self) -> bool:
+        with self.lock:
+            if not self.loaded or self.running:
+                return False
+            self.running = True
+            self.abort_requested = False
+        threading.Thread(target=self._sequence_task, daemon=True).start()
+        return True
+
+    def abort(self):
+        with self.lock:
+            self.abort_requested = True
+            self.valves = {}
+
+    def _wait(self, seconds: float) -> bool:
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            if self.abort_requested:
+                return False
+            time.sleep(min(0.01, max(0.0, end - time.perf_counter())))
+        return not self.abort_requested
+
+    def _sequence_task(self):
+        for i, step in enumerate(list(self.sequence)):
+            if self.abort_requested or step is None:
+                break
+            self._set_status(i, SEQ_RUNNING)
+            profile_ms = 0
+            for a in step.get("actions", []):
+                if a.get("action") == "PROFILE":
+                    profile_ms += a.get("interval_ms", 10) * len(a.get("points", []))
+                    self.valves[a.get("valve")] = bool(a.get("points")) and a["points"][-1] > 0
+                else:
+                    self.valves[a.get("valve")] = a.get("action") == "OPEN"
+            if step.get("hold"):
+                self._wait(profile_ms / 1000.0)
+                while not self.abort_requested:
+                    time.sleep(0.1)
+                break
+            wait_ms = profile_ms if profile_ms else (step.get("duration_ms") or 0)
+            if not self._wait(wait_ms / 1000.0):
+                break
+        self._set_status(-1, SEQ_ABORTED if self.abort_requested else SEQ_COMPLETE)
+        with self.lock:
+            self.running = False
+            self.abort_requested = False
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    state: StandInState = None
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _json(self, obj: dict, status: int = 200):
+        self._bytes(json.dumps(obj).encode(), "application/json", status)
+
+    def _bytes(self, body: bytes, content_type: str, status: int = 200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, message: str):
+        self._json({"status": "error", "message": message}, 400)
+
+    def _body(self) -> dict | None:
+        length = int(self.headers.get("Content-Length", 0))
+        if length <= 0 or length > 8192:
+            return None
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return None
+
+    def do_GET(self):
+        s = self.state
+        url = urlsplit(self.path)
+        if url.path == "/":
+            self._json({"device": "FlowBench stand-in"})
+        elif url.path == "/pressures" and "application/octet-stream" in self.headers.get("Accept", ""):
+            since = parse_qs(url.query).get("since")
+            self._bytes(s.frames(int(since[0]) if since else None), "application/octet-stream")
+        elif url.path == "/pressures":
+            with s.lock:
+                values = [round(v, 3) for v in s.latest]
+            self._json({"pressures": values})
+        elif url.path == "/sequence":
+            with s.lock:
+                self._json({"loaded": s.loaded, "hash": s.hash, "step_hashes": s.step_hashes})
+        else:
+            self._error("Not found")
+
+    def do_POST(self):
+        s = self.state
+        body = self._body()
+        if body is None:
+            self._error("Failed to read body")
+        elif self.path == "/sequence":
+            if s.load(body):
+                self._json({"status": "ok", "hash": s.hash})
+            else:
+                self._error("Invalid sequence JSON")
+        elif self.path == "/run":
+            if s.run():
+                self._json({"status": "ok"})
+            else:
+                self._error("Failed to start sequence")
+        elif self.path == "/valve":
+            s.valves[body.get("valve")] = body.get("action") == "OPEN"
+            self._json({"status": "ok"})
+        elif self.path == "/panic":
+            s.abort()
+            self._json({"status": "ok"})
+        else:
+            self._error("Not found")
+
+
+STREAM_HEAD = (b"HTTP/1.1 200 OK\r\nContent-Type: application/octet-stream\r\n"
+               b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+
+
+def stream_client(state: StandInState, conn: socket.socket):
+    # Same behaviour as serve_client in stream.cpp - header once, then frames as they're sampled
+    try:
+        with conn:
+            buf = b""
+            while b"\r\n\r\n" not in buf:
+                chunk = conn.recv(1024)
+                if not chunk:
+                    return
+                buf += chunk
+            conn.sendall(STREAM_HEAD + TELEMETRY_HEADER)
+            since = None
+            while True:
+                with state.lock:
+                    state.new_sample.wait(0.5)
+                body = state.frames(since)[len(TELEMETRY_HEADER):]
+                if body:
+                    conn.sendall(body)
+                    since = struct.unpack_from("<I", body, len(body) - FRAME_FORMAT.size)[0]
+    except OSError:
+        pass
+
+
+def serve_stream(state: StandInState, port: int) -> socket.socket:
+    listener = socket.create_server(("127.0.0.1", port))
+
+    def accept_loop():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=stream_client, args=(state, conn), daemon=True).start()
+
+    threading.Thread(target=accept_loop, daemon=True).start()
+    return listener
+
+
+def serve(port: int = 8080, stream_port: int | None = None) -> ThreadingHTTPServer:
+    state = StandInState()
+    handler = type("Handler", (StandInHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.state = state
+    if stream_port is None:
+        stream_port = port + 1 if port else 0
+    server.stream = serve_stream(state, stream_port)
+    server.stream_port = server.stream.getsockname()[1]
+
+    def sampler():
+        # Fixed-period sampling like the esp_timer on the ESP32
+        next_t = time.perf_counter()
+        while True:
+            state.sample()
+            next_t += SAMPLE_PERIOD_S
+            time.sleep(max(0.0, next_t - time.perf_counter()))
+
+    threading.Thread(target=sampler, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    stream_port = int(sys.argv[2]) if len(sys.argv) > 2 else port + 1
+    server = serve(port, stream_port)
+    print(f"[StandIn] Serving FlowBench endpoints on http://127.0.0.1:{port}, stream on port {stream_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
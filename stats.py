@@ -0,0 +1,110 @@
+import math
+from collections import deque
+
+# Rolling statistics over a time window, updated in amortised O(1) per sample however long the
+# window or fast the sample rate. Running sums give mean/std and the least-squares slope, and
+# monotonic deques give min/max. Values are shifted by the first sample and times by a reference
+# that moves with the window, so the sums stay well conditioned. They are also rebuilt exactly
+# once per window length of evictions, so float drift can't accumulate over long tests.
+
+
+class RollingStats:
+    def __init__(self, window_s: float):
+        self.window_s = window_s
+        self._samples = deque()     # (t, v)
+        self._mins = deque()        # Increasing values - front is the window min
+        self._maxs = deque()        # Decreasing values - front is the window max
+        self._k = None              # Value shift
+        self._t_ref = None          # Time shift
+        self._evictions = 0
+        self._reset_sums()
+
+    def _reset_sums(self):
+        self._sv = self._svv = self._st = self._stt = self._stv = 0.0
+
+    def _accumulate(self, t: float, v: float, sign: float):
+        t, v = t - self._t_ref, v - self._k
+        self._sv += sign * v
+        self._svv += sign * v * v
+        self._st += sign * t
+        self._stt += sign * t * t
+        self._stv += sign * t * v
+
+    def _rebuild(self):
+        self._reset_sums()
+        self._t_ref = self._samples[0][0] if self._samples else self._t_ref
+        for t, v in self._samples:
+            self._accumulate(t, v, 1.0)
+        self._evictions = 0
+
+    def add(self, t: float, v: float):
+        if self._k is None:
+            self._k, self._t_ref = v, t
+        self._samples.append((t, v))
+        self._accumulate(t, v, 1.0)
+        while self._mins and self._mins[-1] > v:
+            self._mins.pop()
+        self._mins.append(v)
+        while self._maxs and self._maxs[-1] < v:
+            self._maxs.pop()
+        self._maxs.append(v)
+
+        cutoff = t - self.window_s
+        while self._samples[0][0] <= cutoff:
+            old_t, old_v = self._samples.popleft()
+            self._accumulate(old_t, old_v, -1.0)
+            if self._mins[0] == old_v:
+                self._mins.popleft()
+            if self._maxs[0] == old_v:
+                self._maxs.popleft()
+            self._evictions += 1
+        if self._evictions >= len(self._samples):
+            self._rebuild()
+
+    @property
+    def count(self) -> int:
+        return len(self._samples)
+
+    @property
+    def mean(self) -> float:
+        n = len(self._samples)
+        return self._k + self._sv / n if n else math.nan
+
+    @property
+    def std(self) -> float:
+        n = len(self._samples)
+        if n < 2:
+            return math.nan
+        return math.sqrt(max(self._svv / n - (self._sv / n) ** 2, 0.0))
+
+    @property
+    def min(self) -> float:
+        return self._mins[0] if self._mins else math.nan
+
+    @property
+    def max(self) -> float:
+        return self._maxs[0] if self._maxs else math.nan
+
+    @property
+    def slope(self) -> float:
+        # Least-squares slope in units per second
+        n = len(self._samples)
+        denom = n * self._stt - self._st ** 2
+        if n < 2 or denom <= 1e-12:
+            return math.nan
+        return (n * self._stv - self._st * self._sv) / denom
+
+
+class ChannelStats:
+    # One RollingStats per window for a single channel
+    FIELDS = ("mean", "std", "min", "max", "slope")
+
+    def __init__(self, windows_s: list[float]):
+        self.windows = [RollingStats(w) for w in windows_s]
+
+    def add(self, t: float, v: float):
+        for w in self.windows:
+            w.add(t, v)
+
+    def row(self) -> list[float]:
+        return [getattr(w, f) for w in self.windows for f in self.FIELDS]
@@ -0,0 +1,16 @@
+import numpy as np
+import analysis
+
+
+def test_event_metrics_ignores_channels_lost_in_noise():
+    rng = np.random.default_rng(0)
+    t = np.arange(0.0, 5.0, 0.05)
+    stepped = np.where(t >= 0.5, 30.0, 20.0) + rng.normal(0, 0.05, len(t))
+    noisy = 50.0 + rng.normal(0, 2.0, len(t))
+    y = np.column_stack([stepped, noisy])
+    m = analysis.event_metrics(t, y, 0.0, np.array([20.0, 50.0]), np.array([0.05, 2.0]))
+    assert np.isfinite(m["rise_time"][0]) and np.isfinite(m["settling_time"][0])
+    assert m["overshoot_pct"][0] < 5.0
+    for key in ("rise_time", "settling_time", "overshoot_pct"):
+        assert np.isnan(m[key][1])
+    assert np.isfinite(m["ss_mean"][1])
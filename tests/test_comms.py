@@ -0,0 +1,57 @@
+import threading
+import time
+import pytest
+import comms
+import standin
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = standin.serve(0, 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(comms, "ESP32_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}")
+    yield server
+    server.shutdown()
+    server.stream.close()
+
+
+def poll(c: comms.Comms, seconds: float) -> list[int]:
+    seqs = []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        frames = c.read_telemetry()
+        if frames is not None:
+            seqs += frames["seq"].tolist()
+        time.sleep(standin.SAMPLE_PERIOD_S)
+    return seqs
+
+
+def test_telemetry_resyncs_after_reboot(server):
+    c = comms.Comms()
+    time.sleep(0.5)
+    assert poll(c, 0.3)
+    assert c.last_seq > 5
+
+    server.state.reboot()
+    seqs = poll(c, 0.5)
+    assert seqs, "polling stalled after the ESP32 restarted"
+    assert max(seqs) < 20
+    assert c.frames_lost == 0
+
+
+def test_telemetry_resyncs_with_old_firmware(server, monkeypatch):
+    # Firmware that keeps waiting for since + 1 after a reboot - the host gives up on last_seq
+    monkeypatch.setattr(comms, "TELEMETRY_STALL_S", 0.2)
+    old_frames = server.state.frames
+
+    def frames(since):
+        return standin.TELEMETRY_HEADER if since is not None and since >= server.state.next_seq else old_frames(since)
+
+    monkeypatch.setattr(server.state, "frames", frames)
+    c = comms.Comms()
+    time.sleep(0.5)
+    poll(c, 0.3)
+
+    server.state.reboot()
+    assert poll(c, 0.8)
+    assert c.last_seq < 20
@@ -0,0 +1,44 @@
+import os
+import recording
+
+HEADER = b"time_elapsed,P1,P2,P3,P4\r\n"
+VALVES = b"time_elapsed,Solenoid_Valve_1,Solenoid_Valve_2,Servo_Valve_1,sequence_event,device_t_ms\r\n"
+
+
+def make_chunk(folder, rows: int, tail: bytes) -> str:
+    body = b"".join(b"%.2f,50.0000,1.0000,2.0000,3.0000\r\n" % (i * 0.05) for i in range(rows))
+    path = os.path.join(folder, "pressure_0000.csv")
+    with open(path, "wb") as f:
+        f.write(HEADER + body + tail)
+    with open(os.path.join(folder, "valves_0000.csv"), "wb") as f:
+        f.write(VALVES + b"0.0,CLOSED,CLOSED,CLOSED,chunk,\r\n")
+    return path
+
+
+def test_recover_cuts_nul_padded_tail(tmp_path):
+    path = make_chunk(tmp_path, 100, b"4.99,50.1" + b"\0" * 1000)
+    manifest = recording.recover(str(tmp_path))
+    with open(path, "rb") as f:
+        data = f.read()
+    assert b"\0" not in data
+    assert data.endswith(b"4.95,50.0000,1.0000,2.0000,3.0000\r\n")
+    chunk = manifest["chunks"][0]
+    assert (chunk["samples"], chunk["t_start"], chunk["t_end"]) == (100, 0.0, 4.95)
+
+
+def test_recover_cuts_long_tail_without_newline(tmp_path):
+    # Longer than one TAIL_READ_BYTES block, so the last newline is further back
+    tail = b"5.00," + b"7" * (recording.TAIL_READ_BYTES + 1000)
+    path = make_chunk(tmp_path, 100, tail)
+    manifest = recording.recover(str(tmp_path))
+    assert os.path.getsize(path) == len(HEADER) + sum(len(b"%.2f,50.0000,1.0000,2.0000,3.0000\r\n" % (i * 0.05))
+                                                      for i in range(100))
+    assert manifest["chunks"][0]["samples"] == 100
+
+
+def test_recover_keeps_header_of_empty_chunk(tmp_path):
+    path = make_chunk(tmp_path, 0, b"\0" * (2 * recording.TAIL_READ_BYTES))
+    manifest = recording.recover(str(tmp_path))
+    with open(path, "rb") as f:
+        assert f.read() == HEADER
+    assert manifest["chunks"][0]["samples"] == 0
@@ -0,0 +1,248 @@
+import csv
+import os
+import numpy as np
+
+# Time index over one recording, joining pressure samples and valve events on a common
+# time axis. Samples and events are kept in sorted, append-only numpy arrays so any
+# windowed lookup is a pair of binary searches returning array slices (views, no copies).
+
+VALVE_LOG_EXTRA = ("sequence_event", "device_t_ms")   # Valve log columns after the valve states
+
+
+class RecordingIndex:
+    def __init__(self, channels: list[str], valves: list[str], capacity: int = 1024):
+        self.channels = list(channels)
+        self.valves = list(valves)
+        self.n = 0
+        self.n_events = 0
+        self._t = np.empty(capacity)
+        self._v = np.empty((capacity, len(self.channels)))
+        self._et = np.empty(64)
+        self._evalve = np.empty(64, dtype=np.int16)
+        self._eopen = np.empty(64, dtype=bool)
+        self._epos = np.empty(64, dtype=np.int64)
+        self._valve_states = [False] * len(self.valves)
+
+    # Views of the filled part of the arrays
+    @property
+    def times(self) -> np.ndarray:
+        return self._t[:self.n]
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._v[:self.n]
+
+    @property
+    def event_times(self) -> np.ndarray:
+        return self._et[:self.n_events]
+
+    @property
+    def event_valves(self) -> np.ndarray:
+        return self._evalve[:self.n_events]
+
+    @property
+    def event_open(self) -> np.ndarray:
+        return self._eopen[:self.n_events]
+
+    @property
+    def event_positions(self) -> np.ndarray:
+        # Index of the first sample at or after each event
+        return self._epos[:self.n_events]
+
+    # Building - amortised O(1) appends, arrays double when full
+    def append_sample(self, t: float, values):
+        if self.n == len(self._t):
+            self._t = np.resize(self._t, 2 * self.n)
+            self._v = np.resize(self._v, (2 * self.n, len(self.channels)))
+        self._t[self.n] = t
+        self._v[self.n] = values
+        self.n += 1
+
+    def append_event(self, t: float, valve_idx: int, is_open: bool):
+        if self.n_events == len(self._et):
+            size = 2 * self.n_events
+            self._et = np.resize(self._et, size)
+            self._evalve = np.resize(self._evalve, size)
+            self._eopen = np.resize(self._eopen, size)
+            self._epos = np.resize(self._epos, size)
+        i = self.n_events
+        self._et[i] = t
+        self._evalve[i] = valve_idx
+        self._eopen[i] = is_open
+        self._epos[i] = self.n
+        self._valve_states[valve_idx] = is_open
+        self.n_events += 1
+
+    def append_valve_states(self, t: float, states):
+        # Full valve state (as written to the valve log) - only changes become events
+        for i, state in enumerate(states):
+            if bool(state) != self._valve_states[i]:
+                self.append_event(t, i, bool(state))
+
+    def trim_before(self, t: float) -> int:
+        # Drops samples and events before t in place so a live index stays bounded - returns the
+        # number of events dropped (event indices after it shift down by that much)
+        k = int(np.searchsorted(self.times, t, side="left"))
+        ke = int(np.searchsorted(self.event_times, t, side="left"))
+        if k:
+            self._t[:self.n - k] = self._t[k:self.n]
+            self._v[:self.n - k] = self._v[k:self.n]
+            self.n -= k
+        if ke:
+            m = self.n_events - ke
+            for a in (self._et, self._evalve, self._eopen, self._epos):
+                a[:m] = a[ke:self.n_events]
+            self.n_events = m
+        if k:
+            self._epos[:self.n_events] = np.maximum(self._epos[:self.n_events] - k, 0)
+        return ke
+
+    # Lookups
+    def slice_between(self, t0: float, t1: float) -> slice:
+        lo, hi = np.searchsorted(self.times, [t0, t1])
+        return slice(int(lo), int(hi))
+
+    def window(self, t0: float, t1: float) -> tuple[np.ndarray, np.ndarray]:
+        s = self.slice_between(t0, t1)
+        return self.times[s], self.values[s]
+
+    def events_between(self, t0: float, t1: float) -> tuple[int, int]:
+        lo, hi = np.searchsorted(self.event_times, [t0, t1])
+        return int(lo), int(hi)
+
+    def find_event(self, valve: str, action: str = "OPEN", nth: int = 0) -> int | None:
+        matches = np.flatnonzero((self.event_valves == self.valves.index(valve))
+                                 & (self.event_open == (action == "OPEN")))
+        return int(matches[nth]) if nth < len(matches) else None
+
+    def around_event(self, event: int, before: float = 0.0, after: float = 0.2) -> tuple[np.ndarray, np.ndarray]:
+        # e.g. pressure in the 200 ms after Solenoid Valve 2 opened:
+        #   idx.around_event(idx.find_event("Solenoid_Valve_2"), after=0.2)
+        t0 = self.event_times[event]
+        return self.window(t0 - before, t0 + after)
+
+    # Persistence - cached next to the CSVs so later opens skip parsing them
+    def save(self, path: str):
+        np.savez(path, times=self.times, values=self.values,
+                 event_times=self.event_times, event_valves=self.event_valves,
+                 event_open=self.event_open, event_positions=self.event_positions,
+                 channels=np.array(self.channels), valves=np.array(self.valves))
+
+    @classmethod
+    def load(cls, path: str) -> "RecordingIndex":
+        with np.load(path) as data:
+            idx = cls(data["channels"].tolist(), data["valves"].tolist(), capacity=1)
+            idx._t, idx._v = data["times"], data["values"]
+            idx._et, idx._evalve = data["event_times"], data["event_valves"]
+            idx._eopen, idx._epos = data["event_open"], data["event_positions"]
+        idx.n, idx.n_events = len(idx._t), len(idx._et)
+        if idx.n_events:
+            last = {}
+            for v, o in zip(idx._evalve.tolist(), idx._eopen.tolist()):
+                last[v] = o
+            for v, o in last.items():
+                idx._valve_states[v] = o
+        if idx.n == 0:
+            idx._t, idx._v = np.empty(1), np.empty((1, len(idx.channels)))
+        if idx.n_events == 0:
+            idx._et, idx._evalve = np.empty(1), np.empty(1, dtype=np.int16)
+            idx._eopen, idx._epos = np.empty(1, dtype=bool), np.empty(1, dtype=np.int64)
+        return idx
+
+    @classmethod
+    def from_csv(cls, pressure_path: str, valve_path: str) -> "RecordingIndex":
+        channels, t, values = load_pressures(pressure_path)
+        valves, events = load_valve_log(valve_path)
+        idx = cls(channels, valves, capacity=max(len(t), 1))
+        idx._t[:len(t)] = t
+        idx._v[:len(t)] = values
+        idx.n = len(t)
+        for et, states in events:
+            idx.append_valve_states(et, states)
+        idx._epos[:idx.n_events] = np.searchsorted(idx.times, idx.event_times)
+        return idx
+
+    @classmethod
+    def concat(cls, parts: list["RecordingIndex"], channels: list[str], valves: list[str]) -> "RecordingIndex":
+        # Joins consecutive indexes (e.g. the chunks of a recording). Each part starts from
+        # all-closed valves, so events that don't change the running valve state are dropped.
+        n = sum(p.n for p in parts)
+        idx = cls(channels, valves, capacity=max(n, 1))
+        for p in parts:
+            idx._t[idx.n:idx.n + p.n] = p.times
+            idx._v[idx.n:idx.n + p.n] = p.values
+            for t, v, o, pos in zip(p.event_times.tolist(), p.event_valves.tolist(),
+                                    p.event_open.tolist(), p.event_positions.tolist()):
+                if idx._valve_states[v] != o:
+                    idx.append_event(t, v, o)
+                    idx._epos[idx.n_events - 1] = idx.n + pos
+            idx.n += p.n
+        return idx
+
+    @classmethod
+    def open(cls, pressure_path: str, valve_path: str) -> "RecordingIndex":
+        # Built lazily from the CSVs on first open, then reused while it is newer than both logs
+        path = index_path(pressure_path)
+        if os.path.exists(path) and os.path.getmtime(path) >= max(
+                os.path.getmtime(pressure_path), os.path.getmtime(valve_path)):
+            return cls.load(path)
+        idx = cls.from_csv(pressure_path, valve_path)
+        try:
+            idx.save(path)
+        except OSError:
+            pass   # Read-only log folder - just don't cache
+        return idx
+
+
+def index_path(pressure_path: str) -> str:
+    folder, name = os.path.split(pressure_path)
+    return os.path.join(folder, "index_" + name[len("pressure_"):-len(".csv")] + ".npz")
+
+
+def _complete_rows(path: str, columns: int) -> list[str]:
+    # Rows of a log whose last row was cut short by a crash - like recording.recover, anything
+    # after a NUL (unwritten blocks after a power loss) goes, then a malformed final row
+    with open(path, newline="") as f:
+        text = f.read()
+    if "\0" in text:
+        text = text[:text.index("\0")]
+    rows = text.splitlines()[1:]
+    while rows and not rows[-1].strip():
+        rows.pop()
+    if rows:
+        try:
+            if len([float(v) for v in rows[-1].split(",")]) != columns:
+                raise ValueError
+        except ValueError:
+            print(f"[TimeIndex] WARNING: Dropped partial last row of {os.path.basename(path)}")
+            rows.pop()
+    return rows
+
+
+def load_pressures(path: str) -> tuple[list[str], np.ndarray, np.ndarray]:
+    with open(path, newline="") as f:
+        header = next(csv.reader(f))
+    try:
+        data = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+    except ValueError:
+        # Only a damaged last row is tolerated - anything else still raises here
+        rows = _complete_rows(path, len(header))
+        data = np.loadtxt(rows, delimiter=",", ndmin=2) if rows else np.empty((0, len(header)))
+    if data.size == 0:
+        return header[1:], np.empty(0), np.empty((0, len(header) - 1))
+    return header[1:], data[:, 0], data[:, 1:]
+
+
+def load_valve_log(path: str) -> tuple[list[str], list[tuple[float, list[bool]]]]:
+    # Valve log rows are full valve state at each change, optionally followed by the
+    # VALVE_LOG_EXTRA columns (older logs don't have them)
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        names = next(reader)[1:]
+        n = next((i for i, name in enumerate(names) if name in VALVE_LOG_EXTRA), len(names))
+        names = names[:n]
+        rows = [row for row in reader if row]
+    if rows and (len(rows[-1]) <= n or rows[-1][n] not in ("OPEN", "CLOSED") or "\0" in rows[-1][0]):
+        print(f"[TimeIndex] WARNING: Dropped partial last row of {os.path.basename(path)}")
+        rows.pop()
+    return names, [(float(row[0]), [s == "OPEN" for s in row[1:n + 1]]) for row in rows]
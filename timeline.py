@@ -0,0 +1,181 @@
+import math
+import numpy as np
+from stats import RollingStats
+
+# Expected timeline of a compiled sequence. The payload sent to the ESP32 fixes all of its
+# timing (durations, holds, servo profile points and interval_ms), so it is expanded once
+# into sorted arrays of valve transitions and servo positions against time since the run
+# started. Lookups at any time are binary searches.
+#
+# DeviationTracker follows a run sample by sample: step start times reported by the ESP32
+# are compared with the expected ones, and after each expected transition it waits for the
+# pressures to respond to measure the lag.
+
+SERVO_ACTION = "PROFILE"
+BASELINE_S = 0.5            # Pressure baseline taken over this long before each transition
+RESPONSE_SIGMA = 4.0        # A response is a departure of this many baseline σ...
+RESPONSE_MIN_BAR = 1.0      # ...and at least this many bar
+RESPONSE_TIMEOUT_S = 2.0    # No response within this long counts as missed
+RESPONSE_MERGE_S = 0.05     # Transitions closer than this share one expected response
+
+
+class ExpectedTimeline:
+    def __init__(self, sequence: list[dict], valves: list[str], initial_states: list[bool] | None = None):
+        self.valves = list(valves)
+        states = list(initial_states) if initial_states else [False] * len(self.valves)
+        self.initial_states = list(states)
+        starts, ends = [], []
+        trans = []          # (t, valve index, open)
+        servo_t, servo_pos = [0.0], [math.nan]
+        t = 0.0
+        for step in sequence:
+            starts.append(t)
+            profile_t = t
+            for a in step["actions"]:
+                if a["valve"] not in self.valves:
+                    continue
+                v = self.valves.index(a["valve"])
+                if a["action"] != SERVO_ACTION:
+                    trans.append((t, v, a["action"] == "OPEN"))
+                    continue
+                # The ESP32 runs each profile in turn, holding points[i] for interval_ms
+                points = a.get("points", [])
+                tick = a.get("interval_ms", 10) / 1000.0
+                servo_t.extend(profile_t + i * tick for i in range(len(points)))
+                servo_pos.extend(points)
+                trans.extend((profile_t + i * tick, v, p > 0) for i, p in enumerate(points))
+                profile_t += tick * len(points)
+            if step.get("hold"):
+                t = math.inf
+            elif profile_t > t:
+                t = profile_t
+            else:
+                t += (step.get("duration_ms") or 0) / 1000.0
+            ends.append(t)
+            if t == math.inf:
+                break
+        self.step_starts = np.array(starts)
+        self.step_ends = np.array(ends)
+        self.duration_s = ends[-1] if ends else 0.0
+        self.servo_t = np.array(servo_t)
+        self.servo_pos = np.array(servo_pos)
+
+        # Keep only real changes, then one row of valve states per remaining transition
+        trans.sort(key=lambda x: x[0])
+        kept = []
+        for t, v, open_ in trans:
+            if states[v] != open_:
+                states[v] = open_
+                kept.append((t, v, open_))
+        self.trans_t = np.array([k[0] for k in kept])
+        self.trans_valve = np.array([k[1] for k in kept], dtype=np.int16)
+        self.trans_open = np.array([k[2] for k in kept], dtype=bool)
+        self._states = np.empty((len(kept) + 1, len(self.valves)), dtype=bool)
+        self._states[0] = self.initial_states
+        for i, (_, v, open_) in enumerate(kept):
+            self._states[i + 1] = self._states[i]
+            self._states[i + 1, v] = open_
+        # Instants a pressure response is expected after - transitions bunched closer than
+        # RESPONSE_MERGE_S (e.g. a profile's first ticks) can't be told apart in the pressures
+        t = np.unique(self.trans_t)
+        self.response_t = t[np.diff(t, prepend=-math.inf) > RESPONSE_MERGE_S]
+
+    @property
+    def n_transitions(self) -> int:
+        return len(self.trans_t)
+
+    def states_at(self, t: float) -> np.ndarray:
+        return self._states[int(np.searchsorted(self.trans_t, t, side="right"))]
+
+    def servo_at(self, t: float) -> float:
+        # Normalised servo position (0 -> 1), nan before the first profile starts
+        return float(self.servo_pos[int(np.searchsorted(self.servo_t, t, side="right")) - 1])
+
+    def step_at(self, t: float) -> int:
+        # Step running at t, -1 before the start or after the end
+        i = int(np.searchsorted(self.step_starts, t, side="right")) - 1
+        return i if i >= 0 and t < self.step_ends[i] else -1
+
+
+class DeviationTracker:
+    # Lives as long as the acquisition so the pressure baseline is always warm, start() begins a run
+    def __init__(self, channels: int):
+        self._baseline = [RollingStats(BASELINE_S) for _ in range(channels)]
+        self.start(None)
+
+    def start(self, timeline: ExpectedTimeline | None):
+        self.timeline = timeline
+        self.t0 = None              # Host time of the step 0 start
+        self.device_t0 = None       # ESP32 time of the step 0 start (ms)
+        self.step_errors = {}       # step -> reported start minus expected start (s)
+        self.steps_skipped = 0      # Steps that fell between two frames, so have no reported start
+        self.responses = []         # (expected t, observed t or nan, channel or -1), host time
+        self.max_step_error_s = 0.0
+        self.n_responded = 0
+        self.lag_sum_s = 0.0
+        self.max_lag_s = 0.0
+        self._next = 0              # Next entry of timeline.response_t to arm
+        self._armed = None          # (expected t, baseline means, thresholds)
+
+    @property
+    def started(self) -> bool:
+        return self.t0 is not None
+
+    def on_step(self, step: int, t: float, device_t_ms: int):
+        # Step start reported by the ESP32 - the first one anchors the timeline on both clocks
+        if self.timeline is None:
+            return
+        starts = self.timeline.step_starts
+        if not 0 <= step < len(starts):
+            return
+        expected = float(starts[step])
+        if self.t0 is None or step == 0:
+            self.t0 = t - expected
+            self.device_t0 = device_t_ms - int(round(expected * 1000))
+        error = ((device_t_ms - self.device_t0) & 0xFFFFFFFF) / 1000.0 - expected
+        self.step_errors[step] = error
+        self.max_step_error_s = max(self.max_step_error_s, abs(error))
+
+    def on_skipped(self, count: int):
+        if self.timeline is not None:
+            self.steps_skipped += count
+
+    def add(self, t: float, values: list[float]):
+        if self.t0 is not None:
+            self._check(t, values)
+        for b, v in zip(self._baseline, values):
+            b.add(t, v)
+
+    def _check(self, t: float, values: list[float]):
+        armed = self._armed
+        if armed is not None:
+            te, means, limits = armed
+            for ch, (v, m, lim) in enumerate(zip(values, means, limits)):
+                if abs(v - m) > lim:
+                    self._close(te, t, ch)
+                    break
+            else:
+                if t - te > RESPONSE_TIMEOUT_S:
+                    self._close(te, math.nan, -1)
+        expected = self.timeline.response_t
+        while self._next < len(expected) and self.t0 + expected[self._next] <= t:
+            if self._armed is not None:
+                # The next transition came before this one got a response
+                self._close(self._armed[0], math.nan, -1)
+            te = self.t0 + float(expected[self._next])
+            self._next += 1
+            means = [b.mean for b in self._baseline]
+            limits = [max(RESPONSE_SIGMA * b.std if b.count > 1 else 0.0, RESPONSE_MIN_BAR) for b in self._baseline]
+            self._armed = (te, means, limits)
+
+    def _close(self, te: float, t: float, channel: int):
+        self.responses.append((te, t, channel))
+        self._armed = None
+        if channel >= 0:
+            self.n_responded += 1
+            self.lag_sum_s += t - te
+            self.max_lag_s = max(self.max_lag_s, t - te)
+
+    @property
+    def mean_lag_s(self) -> float:
+        return self.lag_sum_s / self.n_responded if self.n_responded else math.nan
@@ -0,0 +1,136 @@
+import json
+import math
+
+# Host-side check of a compiled sequence against what the ESP32 will actually do with it.
+# Mirrors the limits in firmware/main/sequence.h and Wifi.cpp, and simulates the timing of
+# sequence_task: vTaskDelay only waits whole FreeRTOS ticks (pdMS_TO_TICKS rounds down), so
+# sub-tick parts of durations and profile intervals are lost on the ESP32.
+#
+# Cheap enough to run on every edit - payload size comes from per-step JSON sizes that the
+# controller caches with each compiled step, so nothing is re-serialised.
+
+MAX_STEPS = 32
+MAX_ACTIONS_PER_STEP = 4
+MAX_PROFILE_POINTS = 200
+MAX_VALVE_NAME_LEN = 32          # Including the terminator - names are cut to 31 chars
+HTTP_BUF_SIZE = 8192             # Largest POST body Wifi.cpp accepts
+FREERTOS_HZ = 100                # CONFIG_FREERTOS_HZ in firmware/sdkconfig
+TICK_MS = 1000 // FREERTOS_HZ
+DURATION_SLICE_MS = 10           # Timed steps wait in slices of this much so they can be aborted
+DEFAULT_INTERVAL_MS = 10         # Used by the firmware when a PROFILE has no interval_ms
+ACTIONS = ("OPEN", "CLOSE", "PROFILE")
+
+# Fixed parts of the body requests.post(json=...) sends for a full upload
+_BODY_HEAD = len('{"sequence": [')
+_BODY_TAIL = len('], "step_count": ') + len(', "step_hashes": [') + len('], "hash": ') + 1
+_HASH_BYTES = 18                 # Quoted 16-char hash
+
+
+def ticks(ms: int) -> int:
+    # pdMS_TO_TICKS
+    return int(ms) * FREERTOS_HZ // 1000
+
+
+def step_json_size(step: dict) -> int:
+    # Bytes the step takes in the body - same serialisation as requests.post(json=...)
+    return len(json.dumps(step).encode())
+
+
+def payload_size(step_sizes: list[int]) -> int:
+    n = len(step_sizes)
+    seps = 2 * max(n - 1, 0)      # ", " between list items
+    return (_BODY_HEAD + sum(step_sizes) + seps + _BODY_TAIL + len(str(n))
+            + n * _HASH_BYTES + seps + _HASH_BYTES)
+
+
+class SequenceReport:
+    def __init__(self):
+        self.errors = []            # Would be rejected, truncated or misread by the ESP32
+        self.warnings = []          # Accepted, but won't run quite as entered
+        self.payload_bytes = 0
+        self.step_ms = []           # Executed duration of each step, inf for a hold
+        self.total_ms = 0.0         # Executed duration of the whole sequence, inf if it holds
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def summary(self) -> str:
+        total = "hold" if math.isinf(self.total_ms) else f"{self.total_ms / 1000:.2f} s"
+        return (f"{len(self.step_ms)} step(s), {total}, "
+                f"{self.payload_bytes / 1024:.1f}/{HTTP_BUF_SIZE // 1024} KB")
+
+
+def simulate_step(step: dict, label: str, report: SequenceReport, valve_names=None) -> float:
+    # Executed duration of one step in ms (inf for a hold), as sequence_task would run it
+    actions = step.get("actions", [])
+    if len(actions) > MAX_ACTIONS_PER_STEP:
+        report.errors.append(f"{label}: {len(actions)} actions, the ESP32 only keeps the first {MAX_ACTIONS_PER_STEP}")
+        actions = actions[:MAX_ACTIONS_PER_STEP]
+
+    profile_ms = 0
+    has_profile = False
+    for a in actions:
+        valve, action = a.get("valve", ""), a.get("action")
+        if len(valve.encode()) >= MAX_VALVE_NAME_LEN:
+            report.errors.append(f"{label}: valve name '{valve}' is cut to {MAX_VALVE_NAME_LEN - 1} chars on the ESP32")
+        elif valve_names is not None and valve not in valve_names:
+            report.warnings.append(f"{label}: unknown valve '{valve}'")
+        if action not in ACTIONS:
+            # parse_step leaves the type zeroed, which is ACTION_OPEN
+            report.errors.append(f"{label}: unknown action '{action}' would run as OPEN")
+            continue
+        if action != "PROFILE":
+            continue
+        has_profile = True
+        points = a.get("points", [])
+        if len(points) > MAX_PROFILE_POINTS:
+            report.errors.append(f"{label}: {len(points)} profile points, the ESP32 only keeps {MAX_PROFILE_POINTS}")
+            points = points[:MAX_PROFILE_POINTS]
+        if points and (min(points) < 0.0 or max(points) > 1.0):
+            report.warnings.append(f"{label}: profile points outside 0 -> 1")
+        interval = int(a.get("interval_ms", DEFAULT_INTERVAL_MS))
+        run_ms = ticks(interval) * TICK_MS
+        if run_ms == 0 and points:
+            report.errors.append(f"{label}: interval_ms {interval} rounds to 0 ticks - the profile would run instantly")
+        elif run_ms != interval:
+            report.warnings.append(f"{label}: interval_ms {interval} runs as {run_ms} ms "
+                                   f"({len(points) * run_ms} ms profile instead of {len(points) * interval} ms)")
+        profile_ms += len(points) * run_ms
+
+    if step.get("hold"):
+        return math.inf
+    if has_profile:
+        # A profile step lasts as long as its profiles, duration_ms is ignored
+        duration = step.get("duration_ms") or 0
+        if duration and duration != profile_ms:
+            report.warnings.append(f"{label}: runs for its profile ({profile_ms} ms), not {duration} ms")
+        return float(profile_ms)
+    duration = int(step.get("duration_ms") or 0)
+    full, rest = divmod(max(duration, 0), DURATION_SLICE_MS)
+    executed = (full * ticks(DURATION_SLICE_MS) + ticks(rest)) * TICK_MS
+    if executed != duration:
+        report.warnings.append(f"{label}: {duration} ms runs as {executed} ms ({TICK_MS} ms ticks)")
+    return float(executed)
+
+
+def check_sequence(steps: list[dict], labels: list[str] | None = None, valve_names=None,
+                   step_sizes: list[int] | None = None) -> SequenceReport:
+    """Validates and simulates the compiled steps of a sequence. labels name the steps in
+    messages (default "Step 1", ...), step_sizes are cached step_json_size() values."""
+    report = SequenceReport()
+    labels = labels or [f"Step {i + 1}" for i in range(len(steps))]
+    if not steps:
+        report.errors.append("No steps with valves selected")
+    if len(steps) > MAX_STEPS:
+        report.errors.append(f"{len(steps)} steps, the ESP32 only keeps the first {MAX_STEPS}")
+    for i, (step, label) in enumerate(zip(steps, labels)):
+        ms = simulate_step(step, label, report, valve_names)
+        report.step_ms.append(ms)
+        report.total_ms += ms
+        if math.isinf(ms) and i < len(steps) - 1:
+            report.warnings.append(f"{label} holds until PANIC - the {len(steps) - i - 1} step(s) after it never run")
+    report.payload_bytes = payload_size(step_sizes if step_sizes is not None else [step_json_size(s) for s in steps])
+    if report.payload_bytes > HTTP_BUF_SIZE:
+        report.errors.append(f"Sequence is {report.payload_bytes} bytes, the ESP32 accepts at most {HTTP_BUF_SIZE}")
+    return report